@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import Counter, deque
+import numpy as np
+
+
+def parse_profiles(text):
+    """Inference profiles from "name:imgsz:conf,..." listed from full quality to most degraded"""
+    profiles = []
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, imgsz, conf = (field.strip() for field in part.split(":"))
+        if int(imgsz) % 32:
+            raise ValueError(f"Inference profile '{name}' has imgsz {imgsz}, which is not a multiple of 32")
+        profiles.append({"name": name, "level": len(profiles), "imgsz": int(imgsz), "conf": float(conf)})
+    if not profiles:
+        raise ValueError("No inference profiles configured")
+    return profiles
+
+
+class AdaptiveProfiles:
+    """Chooses the inference profile (model input size and confidence threshold) for each batch.
+
+    Profiles are ordered from full quality to most degraded. When the queue
+    depth reaches ``max_queue_depth`` or the recent p95 request latency
+    reaches ``max_p95_seconds``, the next batch runs one profile further
+    down; once both have fallen below ``recover_ratio`` of their limits it
+    steps back up. At most one step is taken every ``hold_seconds``, and
+    latency is only judged on requests that finished since the last step,
+    so the effect of a step is seen before the next one. With fewer than
+    ``min_samples`` such requests the slowest one is used instead of p95.
+
+    ``select`` returns None when adaptation is disabled, so the model runs
+    with its own defaults.
+    """
+
+    def __init__(self, profiles, queue_depth, max_queue_depth=16, max_p95_seconds=1.0, recover_ratio=0.5,
+                 hold_seconds=5.0, window_seconds=15.0, min_samples=20, enabled=True):
+        self.profiles = profiles
+        self.queue_depth = queue_depth
+        self.max_queue_depth = max(1, int(max_queue_depth))
+        self.max_p95 = max_p95_seconds
+        self.recover_ratio = recover_ratio
+        self.hold_seconds = hold_seconds
+        self.window_seconds = window_seconds
+        self.min_samples = max(1, int(min_samples))
+        self.enabled = enabled
+
+        self.level = 0
+        self.changed_at = time.monotonic()
+        self.latencies = deque(maxlen=10000)
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.steps_down = 0
+        self.steps_up = 0
+        self.batches = Counter()
+
+    def observe(self, seconds):
+        """Record the latency of one request"""
+        with self.lock:
+            self.latencies.append((time.monotonic(), seconds))
+
+    def recent_latency(self, now):
+        """p95 (or the maximum, with few samples) of latencies since the last step, or None if there are none"""
+        since = max(now - self.window_seconds, self.changed_at)
+        values = [seconds for finished, seconds in self.latencies if finished >= since]
+        if not values:
+            return None
+        if len(values) < self.min_samples:
+            return max(values)
+        return float(np.percentile(values, 95))
+
+    def select(self):
+        """Profile for the next batch, stepping down or up first if the load calls for it"""
+        if not self.enabled:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            if now - self.changed_at >= self.hold_seconds:
+                depth = self.queue_depth()
+                latency = self.recent_latency(now)
+                overloaded = depth >= self.max_queue_depth or (latency is not None and latency >= self.max_p95)
+                relaxed = (
+                    depth <= self.max_queue_depth * self.recover_ratio
+                    and (latency is None or latency < self.max_p95 * self.recover_ratio)
+                )
+                if overloaded and self.level < len(self.profiles) - 1:
+                    self._step(1, now, depth, latency)
+                elif relaxed and self.level > 0:
+                    self._step(-1, now, depth, latency)
+            profile = self.profiles[self.level]
+            self.batches[profile["name"]] += 1
+            return profile
+
+    def _step(self, direction, now, depth, latency):
+        self.level += direction
+        self.changed_at = now
+        if direction > 0:
+            self.steps_down += 1
+        else:
+            self.steps_up += 1
+        latency_ms = f"{latency * 1000:.0f} ms" if latency is not None else "n/a"
+        print(f"Inference profile -> {self.profiles[self.level]['name']} "
+              f"(queue depth {depth}, recent latency {latency_ms})")
+
+    def current(self):
+        return self.profiles[self.level] if self.enabled else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "profile": self.current(),
+                "profiles": self.profiles,
+                "max_queue_depth": self.max_queue_depth,
+                "max_p95_ms": round(self.max_p95 * 1000, 3),
+                "recover_ratio": self.recover_ratio,
+                "hold_seconds": self.hold_seconds,
+                "steps_down": self.steps_down,
+                "steps_up": self.steps_up,
+                "batches": dict(self.batches),
+            }
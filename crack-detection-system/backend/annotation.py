@@ -0,0 +1,72 @@
+import cv2
+from PIL import Image
+
+BOX_COLOR = (0, 0, 255)
+TEXT_COLOR = (255, 255, 255)
+
+# (factor, flag) for decoding at reduced resolution, largest reduction first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def draw_detections(image, predictions):
+    """Draw prediction boxes and labels onto a BGR image in place"""
+    height, width = image.shape[:2]
+    thickness = max(2, round((height + width) / 2 * 0.003))
+    font_scale = thickness / 3
+
+    for pred in predictions:
+        x1, y1, x2, y2 = (int(round(v)) for v in pred["bbox"])
+        cv2.rectangle(image, (x1, y1), (x2, y2), BOX_COLOR, thickness, lineType=cv2.LINE_AA)
+
+        label = f"{pred['class']} {pred['confidence']:.2f}"
+        (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, max(1, thickness // 2))
+        top = max(y1 - text_height - baseline, 0)
+        cv2.rectangle(image, (x1, top), (x1 + text_width, top + text_height + baseline), BOX_COLOR, -1)
+        cv2.putText(
+            image, label, (x1, top + text_height),
+            cv2.FONT_HERSHEY_SIMPLEX, font_scale, TEXT_COLOR, max(1, thickness // 2), lineType=cv2.LINE_AA
+        )
+
+    return image
+
+
+def render_annotated(image_path, predictions, max_dim=None, longest=None):
+    """Decode an image and draw its predictions, scaled so the longest side is at most ``max_dim``.
+
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale when that still covers
+    ``max_dim``, so small previews of large photos skip most of the decode.
+    ``longest`` is the image's longest side when it is already known, which
+    saves reading its header. Returns None if the image cannot be read.
+    """
+    flags = cv2.IMREAD_COLOR
+    if max_dim:
+        if not longest:
+            with Image.open(image_path) as header:
+                longest = max(header.size)
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+            if longest / factor >= max_dim:
+                flags = reduced_flag
+                break
+    else:
+        longest = None
+
+    image = cv2.imread(image_path, flags)
+    if image is None:
+        return None
+
+    height, width = image.shape[:2]
+    scale = 1.0
+    if max_dim and max(height, width) > max_dim:
+        scale = max_dim / max(height, width)
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+    # Boxes are in original pixel coordinates; the scale is uniform, so EXIF rotation doesn't matter
+    if longest:
+        scale = max(image.shape[:2]) / longest
+    if scale != 1.0:
+        predictions = [dict(pred, bbox=[v * scale for v in pred["bbox"]]) for pred in predictions]
+    return draw_detections(image, predictions)
@@ -0,0 +1,57 @@
+import os
+import threading
+import zipfile
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def iter_uploaded_files(uploads, max_image_bytes):
+    """Yield (filename, read) for each image streamed to a temporary file; ``read()`` returns its bytes.
+
+    Each temporary file is deleted once it has been read.
+    """
+    for upload in uploads:
+        yield upload.filename, _upload_reader(upload, max_image_bytes)
+
+
+def _upload_reader(upload, max_image_bytes):
+    def read():
+        try:
+            if upload.size > max_image_bytes:
+                raise ValueError(f"Image is larger than {max_image_bytes} bytes")
+            with open(upload.tmp_path, "rb") as f:
+                return f.read()
+        finally:
+            upload.discard()
+    return read
+
+
+def open_archive(archive_file):
+    """Open an uploaded zip archive (a path or file object), raising zipfile.BadZipFile if it isn't one"""
+    return zipfile.ZipFile(archive_file)
+
+
+def iter_archive_images(archive, max_image_bytes):
+    """Yield (member name, read) for each image in a zip archive.
+
+    Members are only decompressed when ``read()`` is called, so a large
+    archive is never expanded in memory or on disk as a whole. Reads share a
+    lock because all members come from the same underlying file.
+    """
+    lock = threading.Lock()
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+            continue
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        yield name, _member_reader(archive, info, lock, max_image_bytes)
+
+
+def _member_reader(archive, info, lock, max_image_bytes):
+    def read():
+        if info.file_size > max_image_bytes:
+            raise ValueError(f"Image is larger than {max_image_bytes} bytes")
+        with lock:
+            return archive.read(info)
+    return read
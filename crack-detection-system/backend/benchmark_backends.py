@@ -0,0 +1,164 @@
+"""Compare inference backends on a sample image set.
+
+Reports per-image latency, batched throughput and how closely each backend's
+detections agree with the PyTorch reference, so the fastest backend that is
+still accurate enough can be chosen for CPU-only nodes.
+
+    python benchmark_backends.py --images samples/ --backends pytorch,onnx,int8
+"""
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+import config
+from batch_sources import IMAGE_EXTENSIONS
+from model_backends import BACKENDS, load_model
+from postprocess import result_to_arrays
+
+
+def load_images(directory, limit):
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    images = [cv2.imread(path) for path in paths]
+    return [image for image in images if image is not None]
+
+
+def pairwise_iou(a, b):
+    """IoU matrix between two (n, 4) and (m, 4) xyxy arrays"""
+    xx1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    yy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    xx2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    yy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """Greedily match same-class boxes; returns (matched, reference count, candidate count, matched IoUs)"""
+    ref_boxes, _, ref_cls = reference
+    cand_boxes, _, cand_cls = candidate
+    if len(ref_boxes) == 0 or len(cand_boxes) == 0:
+        return 0, len(ref_boxes), len(cand_boxes), []
+
+    iou = pairwise_iou(ref_boxes, cand_boxes)
+    iou[ref_cls[:, None] != cand_cls[None, :]] = 0
+    matched_ious = []
+    while True:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < iou_threshold:
+            break
+        matched_ious.append(float(iou[i, j]))
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return len(matched_ious), len(ref_boxes), len(cand_boxes), matched_ious
+
+
+def benchmark_backend(model, images, runs, batch_size):
+    """Time single-image latency and batched throughput; returns (stats, detections of the first run)"""
+    model(images[:1], verbose=False)  # warmup
+
+    latencies = []
+    detections = []
+    for run in range(runs):
+        for image in images:
+            started = time.perf_counter()
+            result = model(image, verbose=False)[0]
+            latencies.append((time.perf_counter() - started) * 1000)
+            if run == 0:
+                detections.append(result_to_arrays(result))
+
+    started = time.perf_counter()
+    for run in range(runs):
+        for start in range(0, len(images), batch_size):
+            model(images[start:start + batch_size], verbose=False)
+    elapsed = time.perf_counter() - started
+
+    stats = {
+        "latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "latency_ms_mean": round(float(np.mean(latencies)), 2),
+        "throughput_images_per_s": round(runs * len(images) / elapsed, 2),
+    }
+    return stats, detections
+
+
+def agreement(reference, candidate):
+    """Detection agreement of a backend with the reference over all images"""
+    matched = ref_total = cand_total = 0
+    ious = []
+    for ref, cand in zip(reference, candidate):
+        m, r, c, matched_ious = match_detections(ref, cand)
+        matched += m
+        ref_total += r
+        cand_total += c
+        ious.extend(matched_ious)
+
+    recall = matched / ref_total if ref_total else 1.0
+    precision = matched / cand_total if cand_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+        "mean_matched_iou": round(float(np.mean(ious)), 4) if ious else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", default=config.MODEL_PATH, help="YOLO .pt weights")
+    parser.add_argument("--images", required=True, help="Directory of sample images")
+    parser.add_argument("--backends", default="pytorch,onnx,int8", help=f"Comma-separated subset of {', '.join(BACKENDS)}")
+    parser.add_argument("--limit", type=int, default=50, help="Maximum number of images to use")
+    parser.add_argument("--runs", type=int, default=3, help="Timed passes over the image set")
+    parser.add_argument("--batch-size", type=int, default=config.INFERENCE_MAX_BATCH_SIZE)
+    parser.add_argument("--imgsz", type=int, default=config.MODEL_IMGSZ)
+    parser.add_argument("--cache-dir", default=config.MODEL_CACHE_DIR)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        parser.error(f"No readable images found in {args.images}")
+
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    if "pytorch" in backends:
+        # The PyTorch model is the reference for detection agreement
+        backends.remove("pytorch")
+    backends.insert(0, "pytorch")
+
+    report = {"images": len(images), "runs": args.runs, "batch_size": args.batch_size, "backends": {}}
+    reference = None
+    for backend in backends:
+        print(f"Benchmarking {backend}...")
+        model = load_model(args.weights, backend, args.cache_dir, args.imgsz)
+        stats, detections = benchmark_backend(model, images, args.runs, args.batch_size)
+        if reference is None:
+            reference = detections
+        stats["agreement"] = agreement(reference, detections)
+        report["backends"][backend] = stats
+        del model
+
+    print(f"\n{'backend':<10} {'p50 ms':>8} {'p95 ms':>8} {'img/s':>8} {'F1':>6} {'mIoU':>6}")
+    for backend, stats in report["backends"].items():
+        miou = stats["agreement"]["mean_matched_iou"]
+        print(
+            f"{backend:<10} {stats['latency_ms_p50']:>8} {stats['latency_ms_p95']:>8} "
+            f"{stats['throughput_images_per_s']:>8} {stats['agreement']['f1']:>6} "
+            f"{miou if miou is not None else '-':>6}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Benchmark the API pipeline end to end, in process.
+
+Generates synthetic inspection photos at several resolutions, then drives the
+FastAPI app through an in-process ASGI client at a fixed concurrency. For each
+resolution it measures /predict, /result-image (first render, cached and
+304) and report generation, and reports throughput, latency percentiles and
+peak RSS. Results are written as JSON; pass an earlier file as --compare to
+print the change against it.
+
+    python benchmark_pipeline.py --standin --output bench.json
+    python benchmark_pipeline.py --standin --compare bench.json
+
+The app runs in a scratch directory, so no uploads or results are left
+behind. --standin builds a small randomly initialised YOLO model, so the
+suite runs on machines without the trained weights.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+STANDIN_NAMES = {0: "crack", 1: "spall"}
+
+
+def make_standin_weights(path, model_config="yolov8n.yaml"):
+    """Save an untrained YOLO detection model with the crack classes as a .pt file"""
+    import torch
+    from ultralytics.nn.tasks import DetectionModel
+
+    model = DetectionModel(model_config, nc=len(STANDIN_NAMES), verbose=False)
+    model.names = dict(STANDIN_NAMES)
+    torch.save({"model": model, "train_args": {}}, path)
+    return path
+
+
+def synthetic_image(width, height, seed):
+    """A concrete-like texture with a few dark crack lines, as JPEG bytes"""
+    rng = np.random.default_rng(seed)
+    small = rng.normal(150, 25, (max(1, height // 8), max(1, width // 8))).astype(np.float32)
+    texture = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    texture += rng.normal(0, 6, (height, width)).astype(np.float32)
+    image = cv2.cvtColor(np.clip(texture, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+    for _ in range(3):
+        points = np.cumsum(rng.normal(0, max(width, height) / 40, (12, 2)), axis=0)
+        points += rng.uniform([0, 0], [width, height])
+        cv2.polylines(image, [points.astype(np.int32)], False, (40, 40, 40), max(2, width // 500), cv2.LINE_AA)
+
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+class PeakRSS:
+    """Sample resident memory of this process and the given child pids in a background thread"""
+
+    def __init__(self, child_pids=None, interval=0.02):
+        self.child_pids = child_pids or (lambda: [])
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def current(self):
+        total = 0
+        for pid in ["self", *self.child_pids()]:
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * self.page_size
+            except (OSError, ValueError, IndexError):
+                pass
+        if total == 0:
+            # No /proc: fall back to the process-lifetime peak
+            total = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        return total
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self):
+        self.peak = self.current()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def summarize(latencies, elapsed, errors, peak_rss):
+    latencies_ms = np.asarray(latencies) * 1000
+    stats = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+    }
+    for name, q in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99)):
+        stats[f"latency_ms_{name}"] = round(float(np.percentile(latencies_ms, q)), 2) if len(latencies_ms) else None
+    stats["latency_ms_mean"] = round(float(latencies_ms.mean()), 2) if len(latencies_ms) else None
+    return stats
+
+
+async def drive(request, count, concurrency, child_pids):
+    """Run ``request(i)`` for i in range(count) with ``concurrency`` workers; returns stats"""
+    latencies, errors = [], 0
+    indices = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in indices:
+            started = time.perf_counter()
+            try:
+                await request(i)
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"  request failed: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    with PeakRSS(child_pids) as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, errors, rss.peak)
+
+
+def expect(response, *status):
+    if response.status_code not in status:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path} -> {response.status_code}: {response.text[:200]}")
+    return response
+
+
+async def benchmark_resolution(client, main, width, height, args):
+    """All scenarios for one image size"""
+    child_pids = lambda: list(getattr(main.report_jobs.executor, "_processes", None) or {})
+    images = [synthetic_image(width, height, seed) for seed in range(args.images)]
+
+    file_ids = []
+    for i, data in enumerate(images):
+        response = expect(await client.post("/upload", files={"file": (f"bench_{i}.jpg", data, "image/jpeg")}), 200)
+        file_ids.append(response.json()["file_id"])
+    del images
+
+    async def predict(i):
+        expect(await client.post(f"/predict/{file_ids[i % len(file_ids)]}"), 200)
+
+    async def result_image(i):
+        return expect(await client.get(f"/result-image/{file_ids[i % len(file_ids)]}", params={"max_dim": args.max_dim}), 200)
+
+    etags = {}
+
+    async def result_image_not_modified(i):
+        file_id = file_ids[i % len(file_ids)]
+        expect(await client.get(
+            f"/result-image/{file_id}", params={"max_dim": args.max_dim}, headers={"If-None-Match": etags[file_id]}
+        ), 304)
+
+    async def report(i):
+        job = expect(await client.post(f"/generate-report/{file_ids[i % len(file_ids)]}"), 202).json()
+        while True:
+            status = expect(await client.get(job["status_url"]), 200).json()
+            if status["status"] == "completed":
+                return
+            if status["status"] == "failed":
+                raise RuntimeError(status["error"])
+            await asyncio.sleep(args.poll_interval)
+
+    results = {}
+    print(f"{width}x{height}: predict")
+    results["predict"] = await drive(predict, args.requests, args.concurrency, child_pids)
+
+    print(f"{width}x{height}: result-image")
+    results["result_image_first"] = await drive(result_image, len(file_ids), args.concurrency, child_pids)
+    results["result_image_cached"] = await drive(result_image, args.requests, args.concurrency, child_pids)
+    for file_id in file_ids:
+        response = expect(await client.get(f"/result-image/{file_id}", params={"max_dim": args.max_dim}), 200)
+        etags[file_id] = response.headers["etag"]
+    results["result_image_304"] = await drive(result_image_not_modified, args.requests, args.concurrency, child_pids)
+
+    print(f"{width}x{height}: report")
+    results["report"] = await drive(report, args.report_requests or len(file_ids), args.concurrency, child_pids)
+
+    for file_id in file_ids:
+        await client.delete(f"/cleanup/{file_id}")
+    return results
+
+
+async def run_suite(main, args):
+    import httpx
+
+    resolutions = [tuple(int(v) for v in size.lower().split("x")) for size in args.resolutions.split(",")]
+    report = {}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=600) as client:
+            expect(await client.get("/health"), 200)
+            # The model loads in the background after startup
+            ready = await client.get("/ready")
+            while ready.json()["model_status"] == "loading":
+                await asyncio.sleep(0.1)
+                ready = await client.get("/ready")
+            if ready.status_code != 200:
+                raise SystemExit("The model failed to load; pass --weights or --standin")
+            for width, height in resolutions:
+                report[f"{width}x{height}"] = await benchmark_resolution(client, main, width, height, args)
+    return report
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline=None):
+    print(f"\n{'resolution':<11} {'scenario':<20} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'RSS MB':>8}")
+    for resolution, scenarios in results.items():
+        for scenario, stats in scenarios.items():
+            line = (
+                f"{resolution:<11} {scenario:<20} {stats['throughput_per_s'] or '-':>8} "
+                f"{stats['latency_ms_p50'] or '-':>9} {stats['latency_ms_p95'] or '-':>9} {stats['peak_rss_mb']:>8}"
+            )
+            before = (baseline or {}).get(resolution, {}).get(scenario)
+            if before and before.get("throughput_per_s") and stats["throughput_per_s"] and before.get("latency_ms_p95") and stats["latency_ms_p95"]:
+                throughput = (stats["throughput_per_s"] / before["throughput_per_s"] - 1) * 100
+                p95 = (stats["latency_ms_p95"] / before["latency_ms_p95"] - 1) * 100
+                line += f"   req/s {throughput:+.1f}%  p95 {p95:+.1f}%"
+            if stats["errors"]:
+                line += f"   ({stats['errors']} errors)"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolutions", default="640x480,1920x1080,4000x3000", help="Comma-separated WIDTHxHEIGHT list")
+    parser.add_argument("--images", type=int, default=16, help="Distinct synthetic images per resolution")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per predict and result-image scenario")
+    parser.add_argument("--report-requests", type=int, default=0, help="Reports per resolution (default: one per image)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-dim", type=int, default=1024, help="max_dim requested from /result-image")
+    parser.add_argument("--poll-interval", type=float, default=0.02, help="Seconds between report job status polls")
+    parser.add_argument("--weights", help="YOLO .pt weights (default: MODEL_PATH)")
+    parser.add_argument("--standin", action="store_true", help="Use a small randomly initialised model instead of trained weights")
+    parser.add_argument("--standin-config", default="yolov8n.yaml", help="Model config for --standin")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache on (off by default, so every predict runs the model)")
+    parser.add_argument("--workdir", help="Directory the app stores files in (default: a temporary directory)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    # Resolve paths before changing into the scratch directory
+    for name in ("output", "compare", "weights"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="crack-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    if args.standin:
+        args.weights = make_standin_weights(os.path.join(workdir, "standin.pt"), args.standin_config)
+    if args.weights:
+        os.environ["MODEL_PATH"] = args.weights
+    if not args.cache:
+        os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    # Nothing in the scratch directory is old enough to expire during a run
+    os.environ.setdefault("RETENTION_INTERVAL_SECONDS", "0")
+
+    # main.py stores its files relative to the working directory
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    import main as app_main
+
+    try:
+        results = asyncio.run(run_suite(app_main, args))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if args.output:
+        # The model the run ended on; None if it never loaded
+        serving = app_main.serving_model
+        document = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "model_version": serving.version if serving is not None else None,
+                "inference_backend": serving.backend if serving is not None else app_main.config.INFERENCE_BACKEND,
+                "standin_model": args.standin,
+                "prediction_cache": args.cache,
+                "settings": {
+                    key: getattr(args, key)
+                    for key in ("resolutions", "images", "requests", "report_requests", "concurrency", "max_dim")
+                },
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Run crack detection over a directory tree of images without the API.
+
+Images are decoded by a pool of threads ahead of inference and run through
+the model in batches. Results go to a SQLite file with one row per image; the
+boxes are packed as a float32 blob. Progress is checkpointed in the same
+transaction as the rows, so an interrupted run continues after the last
+committed image when started again with the same arguments.
+
+    python bulk_ingest.py /data/inspections --output inspections.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import cv2
+import numpy as np
+import config
+from batch_sources import IMAGE_EXTENSIONS
+from model_backends import BACKENDS, load_model, model_version
+from postprocess import result_to_arrays, summarize_detections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    width INTEGER,
+    height INTEGER,
+    crack_count INTEGER,
+    crack_percentage REAL,
+    average_confidence REAL,
+    boxes BLOB,
+    error TEXT,
+    processed_at TEXT
+);
+"""
+
+
+def encode_boxes(xyxy, conf, cls):
+    """Pack detections as an (n, 6) float32 array of x1, y1, x2, y2, confidence, class_id"""
+    return np.column_stack([xyxy, conf, cls]).astype(np.float32).tobytes()
+
+
+def decode_boxes(blob):
+    """Unpack a boxes blob back into (xyxy, conf, cls) arrays"""
+    packed = np.frombuffer(blob, dtype=np.float32).reshape(-1, 6)
+    return packed[:, :4], packed[:, 4], packed[:, 5].astype(np.int64)
+
+
+def walk_key(path):
+    """Sort key matching the order walk_images yields paths in: files before subdirectories"""
+    parts = path.split(os.sep)
+    return tuple((1, part) for part in parts[:-1]) + ((0, parts[-1]),)
+
+
+def walk_images(root, after=None):
+    """Yield image paths relative to ``root`` in a stable sorted order.
+
+    With ``after`` set, paths up to and including it are skipped, which is
+    how a run resumes from its checkpoint. Directories that lie entirely
+    before the checkpoint are not listed at all.
+    """
+    after_key = walk_key(after) if after is not None else None
+    for directory, dirnames, filenames in os.walk(root):
+        relative = os.path.relpath(directory, root)
+        prefix = () if relative == "." else tuple((1, part) for part in relative.split(os.sep))
+        dirnames.sort()
+        if after_key is not None:
+            dirnames[:] = [
+                name for name in dirnames
+                if prefix + ((1, name),) >= after_key[:len(prefix) + 1]
+            ]
+        for name in sorted(filenames):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(relative, name) if prefix else name
+            if after_key is not None and walk_key(path) <= after_key:
+                continue
+            yield path
+
+
+def prefetch(executor, func, items, depth):
+    """Map ``func`` over ``items`` on the executor, keeping ``depth`` calls in flight, in order"""
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(func, item)))
+        if len(pending) >= depth:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ResultStore:
+    """SQLite store of per-image results and the resume checkpoint"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def add(self, path, width, height, summary, boxes, error=None):
+        crack_count, crack_percentage, average_confidence = summary
+        self.conn.execute(
+            "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, width, height, crack_count, crack_percentage, average_confidence,
+             boxes, error, datetime.now().isoformat())
+        )
+
+    def checkpoint(self, last_path):
+        """Commit the rows added so far together with the path they reach"""
+        self.set_meta("checkpoint", last_path)
+        self.conn.commit()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def read_image(root):
+    return lambda path: cv2.imread(os.path.join(root, path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="Directory tree of images to process")
+    parser.add_argument("--output", default="bulk_results.db", help="SQLite result store")
+    parser.add_argument("--weights", default=config.MODEL_PATH, help="YOLO .pt weights")
+    parser.add_argument("--backend", default=config.INFERENCE_BACKEND, choices=BACKENDS)
+    parser.add_argument("--imgsz", type=int, default=config.MODEL_IMGSZ)
+    parser.add_argument("--cache-dir", default=config.MODEL_CACHE_DIR)
+    parser.add_argument("--batch-size", type=int, default=config.INFERENCE_MAX_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=config.IMAGE_IO_WORKERS, help="Image decode threads")
+    parser.add_argument("--prefetch", type=int, default=0, help="Images decoded ahead of inference (default 4 batches)")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="Images per committed checkpoint")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and process every image again")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} is not a directory")
+
+    model = load_model(args.weights, args.backend, args.cache_dir, args.imgsz)
+    version = model_version(args.weights, args.backend)
+    store = ResultStore(args.output)
+
+    stored_version = store.get_meta("model_version")
+    if stored_version is not None and stored_version != version and not args.restart:
+        parser.error(f"{args.output} holds results from model {stored_version}, use --restart or another --output")
+    store.set_meta("model_version", version)
+    store.set_meta("class_names", json.dumps(model.names))
+    store.set_meta("root", os.path.abspath(args.root))
+
+    resume_after = None if args.restart else store.get_meta("checkpoint")
+    if resume_after is not None:
+        print(f"Resuming after {resume_after} ({store.count()} images already stored)")
+    store.checkpoint(resume_after)
+
+    prefetch_depth = args.prefetch or 4 * args.batch_size
+    processed = since_checkpoint = 0
+    started = time.perf_counter()
+    last_path = resume_after
+
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="decode") as executor:
+        decoded = prefetch(executor, read_image(args.root), walk_images(args.root, resume_after), prefetch_depth)
+        try:
+            for batch in batched(decoded, args.batch_size):
+                images = [image for _, image in batch if image is not None]
+                # Results come back in the order of the readable images
+                results = iter(model(images, verbose=False) if images else [])
+                del images
+
+                for path, image in batch:
+                    if image is None:
+                        store.add(path, None, None, (None, None, None), None, error="Invalid image file")
+                        continue
+                    xyxy, conf, cls = result_to_arrays(next(results))
+                    _, crack_count, average_confidence, crack_percentage = summarize_detections(xyxy, conf, cls, model.names)
+                    height, width = image.shape[:2]
+                    store.add(
+                        path, width, height,
+                        (crack_count, round(crack_percentage, 2), round(average_confidence, 4)),
+                        encode_boxes(xyxy, conf, cls)
+                    )
+
+                last_path = batch[-1][0]
+                processed += len(batch)
+                since_checkpoint += len(batch)
+                if since_checkpoint >= args.checkpoint_every:
+                    store.checkpoint(last_path)
+                    since_checkpoint = 0
+                    rate = processed / (time.perf_counter() - started)
+                    print(f"{processed} images, {rate:.1f} img/s, checkpoint at {last_path}")
+        finally:
+            # Also runs on Ctrl+C, so everything finished before the interrupt is kept
+            store.checkpoint(last_path)
+            store.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Processed {processed} images in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.1f} img/s), results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import os
+
+# YOLO weights
+MODEL_PATH = os.getenv("MODEL_PATH", "/content/drive/MyDrive/yolo-new/bridge_crack_yolov11_best.pt")
+# Inference backend: "pytorch", "onnx" (ONNX Runtime), "int8" (dynamically
+# quantized ONNX) or "openvino"; converted models are cached in MODEL_CACHE_DIR
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "pytorch")
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "model_cache")
+MODEL_IMGSZ = int(os.getenv("MODEL_IMGSZ", "640"))
+# Shared secret for /admin/reload-model and /admin/model (sent as
+# X-Admin-Token); empty disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Seconds a hot reload waits for requests on the old model before it is
+# reported as failed (the new model keeps serving)
+MODEL_DRAIN_TIMEOUT_SECONDS = float(os.getenv("MODEL_DRAIN_TIMEOUT_SECONDS", "300"))
+
+# Inference scheduler (dynamic micro-batching of /predict requests)
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+INFERENCE_MAX_QUEUE_SIZE = int(os.getenv("INFERENCE_MAX_QUEUE_SIZE", "64"))
+
+# Load-adaptive inference: "name:imgsz:conf" profiles from full quality to
+# most degraded. Each batch steps one profile down when the queue depth
+# reaches ADAPTIVE_MAX_QUEUE_DEPTH or recent p95 latency ADAPTIVE_MAX_P95_MS,
+# and back up once both are below ADAPTIVE_RECOVER_RATIO of those limits,
+# at most one step every ADAPTIVE_HOLD_SECONDS
+ADAPTIVE_INFERENCE = os.getenv("ADAPTIVE_INFERENCE", "false").lower() in ("1", "true", "yes")
+INFERENCE_PROFILES = os.getenv("INFERENCE_PROFILES", f"full:{MODEL_IMGSZ}:0.25,reduced:512:0.3,minimal:416:0.35")
+ADAPTIVE_MAX_QUEUE_DEPTH = int(os.getenv("ADAPTIVE_MAX_QUEUE_DEPTH", "16"))
+ADAPTIVE_MAX_P95_MS = float(os.getenv("ADAPTIVE_MAX_P95_MS", "1000"))
+ADAPTIVE_RECOVER_RATIO = float(os.getenv("ADAPTIVE_RECOVER_RATIO", "0.5"))
+ADAPTIVE_HOLD_SECONDS = float(os.getenv("ADAPTIVE_HOLD_SECONDS", "5"))
+ADAPTIVE_WINDOW_SECONDS = float(os.getenv("ADAPTIVE_WINDOW_SECONDS", "15"))
+
+# Shared model server (model_server.py): when MODEL_SERVER_ADDRESS is set (a
+# Unix socket path or host:port) the API sends batches there instead of
+# loading its own copy of the model. MODEL_SERVER_AUTHKEY is the shared secret
+# both sides must set; requests are unpickled, so it has no default
+MODEL_SERVER_ADDRESS = os.getenv("MODEL_SERVER_ADDRESS", "")
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.getenv("MODEL_SERVER_CONNECT_TIMEOUT", "30"))
+# Replicas forked after the weights load, torch threads per replica (0 splits
+# the available cores evenly) and CPU pinning: "" (none), "auto" (one block of
+# cores per replica) or explicit sets such as "0-3;4-7"
+MODEL_REPLICAS = int(os.getenv("MODEL_REPLICAS", "2"))
+MODEL_REPLICA_THREADS = int(os.getenv("MODEL_REPLICA_THREADS", "0"))
+MODEL_REPLICA_AFFINITY = os.getenv("MODEL_REPLICA_AFFINITY", "auto")
+
+# Blocking image I/O (decode, annotate, encode) runs on this thread pool
+IMAGE_IO_WORKERS = int(os.getenv("IMAGE_IO_WORKERS", "4"))
+# /predict requests admitted at once; further requests get 503 until one finishes
+MAX_INFLIGHT_PREDICTIONS = int(os.getenv("MAX_INFLIGHT_PREDICTIONS", "128"))
+# Seconds clients are told to wait before retrying a rejected request
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+# Largest image accepted by /upload and /upload-and-predict (413 above it)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# Tiled inference for large images (/predict/{file_id}?tiled=true)
+TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+# Tiles copied out of the image and queued for inference at a time
+TILE_BATCH_SIZE = int(os.getenv("TILE_BATCH_SIZE", "8"))
+# How duplicate boxes from overlapping tiles are merged: "nms" or "wbf"
+TILE_MERGE_METHOD = os.getenv("TILE_MERGE_METHOD", "nms")
+# Overlap measure used for merging: "iou" or "ios" (intersection over smaller box)
+TILE_MERGE_METRIC = os.getenv("TILE_MERGE_METRIC", "ios")
+TILE_MERGE_IOU = float(os.getenv("TILE_MERGE_IOU", "0.5"))
+
+# /predict-batch: images read, decoded and inferred concurrently per batch request
+BATCH_PREFETCH = int(os.getenv("BATCH_PREFETCH", "16"))
+# Images (uploaded files or zip members) larger than this are skipped with an error line
+BATCH_MAX_IMAGE_BYTES = int(os.getenv("BATCH_MAX_IMAGE_BYTES", str(50 * 1024 * 1024)))
+# Largest /predict-batch request body, archive included (413 above it)
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(20 * 1024 * 1024 * 1024)))
+
+# /predict-video: largest upload, decoded frames buffered between the reader
+# thread and inference, and frames sent to the model together
+MAX_VIDEO_UPLOAD_BYTES = int(os.getenv("MAX_VIDEO_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))
+VIDEO_BUFFER_FRAMES = int(os.getenv("VIDEO_BUFFER_FRAMES", "16"))
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+# Adaptive sampling: a frame is predicted when its scene-change score (mean
+# absolute difference of a grayscale thumbnail from the last predicted frame,
+# 0-1) reaches VIDEO_SCENE_THRESHOLD, no more often than every
+# VIDEO_MIN_INTERVAL_SECONDS and at least every VIDEO_MAX_INTERVAL_SECONDS
+VIDEO_SCENE_THRESHOLD = float(os.getenv("VIDEO_SCENE_THRESHOLD", "0.08"))
+VIDEO_MIN_INTERVAL_SECONDS = float(os.getenv("VIDEO_MIN_INTERVAL_SECONDS", "0.2"))
+VIDEO_MAX_INTERVAL_SECONDS = float(os.getenv("VIDEO_MAX_INTERVAL_SECONDS", "2.0"))
+
+# SQLite index of stored uploads, results and reports by file_id
+FILE_REGISTRY_PATH = os.getenv("FILE_REGISTRY_PATH", "file_registry.db")
+
+# /health reports inference latency percentiles over this many recent seconds
+METRICS_WINDOW_SECONDS = float(os.getenv("METRICS_WINDOW_SECONDS", "300"))
+
+# Storage retention: seconds between sweeps (0 disables), registry entries
+# counted towards area sizes and entries evicted per area in each sweep
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "60"))
+RETENTION_SCAN_BATCH = int(os.getenv("RETENTION_SCAN_BATCH", "1000"))
+RETENTION_EVICT_BATCH = int(os.getenv("RETENTION_EVICT_BATCH", "200"))
+# Per-area limits: hours since last access and total bytes (0 disables either)
+RETENTION_POLICIES = {
+    area: (
+        float(os.getenv(f"RETENTION_{area.upper()}_TTL_HOURS", ttl_hours)),
+        int(os.getenv(f"RETENTION_{area.upper()}_MAX_BYTES", "0"))
+    )
+    for area, ttl_hours in (("uploads", "720"), ("results", "720"), ("reports", "168"))
+}
+
+# SQLite store of every prediction and its boxes, queried by /predictions
+PREDICTION_STORE_PATH = os.getenv("PREDICTION_STORE_PATH", "predictions.db")
+
+# Cached predictions for re-uploaded images (0 disables the cache)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+
+# Near-duplicate reuse: perceptual hashes ("dhash" or "phash") of the last
+# NEAR_DUPLICATE_INDEX_SIZE predicted images (0 disables). An image whose hash
+# differs from one of them in at most NEAR_DUPLICATE_MAX_DISTANCE of 64 bits
+# gets that prediction instead of inference, when the request asks for it
+# with near_duplicates=true or NEAR_DUPLICATE_REUSE makes it the default
+NEAR_DUPLICATE_INDEX_SIZE = int(os.getenv("NEAR_DUPLICATE_INDEX_SIZE", "1024"))
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "4"))
+NEAR_DUPLICATE_HASH = os.getenv("NEAR_DUPLICATE_HASH", "dhash")
+NEAR_DUPLICATE_REUSE = os.getenv("NEAR_DUPLICATE_REUSE", "false").lower() in ("1", "true", "yes")
+
+# Annotated result images are rendered on first request from the stored boxes
+RESULT_VARIANT_DIR = os.getenv("RESULT_VARIANT_DIR", "results/variants")
+RESULT_IMAGE_FORMAT = os.getenv("RESULT_IMAGE_FORMAT", "jpeg")
+RESULT_IMAGE_QUALITY = int(os.getenv("RESULT_IMAGE_QUALITY", "90"))
+
+# PDF report generation worker processes
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Report workers are forked at startup, before the model is loaded
+REPORT_MP_START_METHOD = os.getenv("REPORT_MP_START_METHOD", "fork")
+# Images embedded in reports are resampled to this DPI and stored as JPEG
+REPORT_IMAGE_DPI = int(os.getenv("REPORT_IMAGE_DPI", "150"))
+REPORT_JPEG_QUALITY = int(os.getenv("REPORT_JPEG_QUALITY", "85"))
+REPORT_DERIVATIVE_DIR = os.getenv("REPORT_DERIVATIVE_DIR", "reports/derivatives")
+
+# Campaign reports: most images per report, DPI of the annotated image on each
+# image page, threads drawing those images and detections listed per image
+CAMPAIGN_MAX_IMAGES = int(os.getenv("CAMPAIGN_MAX_IMAGES", "1000"))
+CAMPAIGN_IMAGE_DPI = int(os.getenv("CAMPAIGN_IMAGE_DPI", "100"))
+CAMPAIGN_RENDER_WORKERS = int(os.getenv("CAMPAIGN_RENDER_WORKERS", "4"))
+CAMPAIGN_MAX_BOXES = int(os.getenv("CAMPAIGN_MAX_BOXES", "20"))
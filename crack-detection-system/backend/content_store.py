@@ -0,0 +1,60 @@
+import hashlib
+import os
+import uuid
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path, chunk_size=CHUNK_SIZE):
+    """Hex SHA-256 of a file on disk"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def place_content_addressed(tmp_path, content_hash, directory, extension, find_existing):
+    """Move an already hashed temporary file to its content-addressed path.
+
+    ``find_existing(content_hash)`` returns the path of an identical stored
+    file, or None; on a match the temporary file is discarded and the
+    existing path is reused, otherwise it is renamed to ``<sha256>.<ext>``.
+
+    Returns (path, duplicate).
+    """
+    existing_path = find_existing(content_hash)
+    if existing_path is not None and os.path.exists(existing_path):
+        os.remove(tmp_path)
+        return existing_path, True
+
+    path = os.path.join(directory, f"{content_hash}.{extension}")
+    os.replace(tmp_path, path)
+    return path, False
+
+
+def save_content_addressed(source, directory, extension, find_existing, chunk_size=CHUNK_SIZE):
+    """Stream a file object to ``directory`` while hashing it.
+
+    The bytes are written to a temporary file and hashed in the same pass,
+    then placed with place_content_addressed.
+
+    Returns (path, content_hash, size, duplicate).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as buffer:
+            for chunk in iter(lambda: source.read(chunk_size), b""):
+                digest.update(chunk)
+                buffer.write(chunk)
+                size += len(chunk)
+
+        content_hash = digest.hexdigest()
+        path, duplicate = place_content_addressed(tmp_path, content_hash, directory, extension, find_existing)
+        return path, content_hash, size, duplicate
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+PATH_COLUMNS = ("upload_path", "result_path", "data_path", "report_path", "cache_path")
+
+# Image header facts read once when the upload is received: (column, info key, type)
+IMAGE_COLUMNS = (
+    ("image_format", "format", "TEXT"),
+    ("image_width", "width", "INTEGER"),
+    ("image_height", "height", "INTEGER"),
+    ("orientation", "orientation", "INTEGER"),
+)
+
+# Access times are only rewritten when older than this, so hot files don't cost a write per request
+TOUCH_RESOLUTION_SECONDS = 60
+
+
+class FileRegistry:
+    """Persistent index from file_id to the files stored for it.
+
+    Replaces prefix scans of the upload/result directories with primary-key
+    lookups in an embedded SQLite database, so finding or cleaning up a file
+    costs the same no matter how many uploads are stored.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                file_id TEXT PRIMARY KEY,
+                upload_path TEXT,
+                result_path TEXT,
+                data_path TEXT,
+                report_path TEXT,
+                cache_path TEXT,
+                content_hash TEXT,
+                created_at TEXT NOT NULL,
+                accessed_at REAL,
+                image_format TEXT,
+                image_width INTEGER,
+                image_height INTEGER,
+                orientation INTEGER
+            )
+        """)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(files)")}
+        if "content_hash" not in columns:
+            self.conn.execute("ALTER TABLE files ADD COLUMN content_hash TEXT")
+        if "accessed_at" not in columns:
+            self.conn.execute("ALTER TABLE files ADD COLUMN accessed_at REAL")
+            self.conn.execute("UPDATE files SET accessed_at = CAST(strftime('%s', created_at, 'utc') AS REAL)")
+        for column, _, column_type in IMAGE_COLUMNS:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files (content_hash)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_upload_path ON files (upload_path)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_accessed_at ON files (accessed_at)")
+
+    def register_upload(self, file_id, upload_path, content_hash=None, image_info=None):
+        """Record a newly uploaded file, with its format and dimensions when ``image_info`` has them"""
+        image_info = image_info or {}
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, upload_path, content_hash, created_at, accessed_at, "
+                f"{', '.join(column for column, _, _ in IMAGE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    file_id, upload_path, content_hash, datetime.now().isoformat(), time.time(),
+                    *(image_info.get(key) for _, key, _ in IMAGE_COLUMNS)
+                )
+            )
+
+    def touch(self, file_id):
+        """Record that a file_id's files were just used"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE files SET accessed_at = ? WHERE file_id = ? AND accessed_at < ?",
+                (now, file_id, now - TOUCH_RESOLUTION_SECONDS)
+            )
+
+    def path_for_hash(self, content_hash):
+        """Return the stored upload with the given content hash, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT upload_path FROM files WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+        return row["upload_path"] if row is not None else None
+
+    def update(self, file_id, **paths):
+        """Set one or more of the stored paths for a file_id"""
+        unknown = set(paths) - set(PATH_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown registry columns: {', '.join(sorted(unknown))}")
+        if not paths:
+            return
+
+        assignments = ", ".join(f"{column} = ?" for column in paths)
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE files SET {assignments} WHERE file_id = ?",
+                (*paths.values(), file_id)
+            )
+
+    def set_content_hash(self, file_id, content_hash):
+        """Record the content hash of an upload indexed before hashing existed"""
+        with self.lock:
+            self.conn.execute("UPDATE files SET content_hash = ? WHERE file_id = ?", (content_hash, file_id))
+
+    def get(self, file_id):
+        """Return the stored paths for a file_id, or None if it is unknown"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def upload_path(self, file_id):
+        """Return the path of the original upload, or None if it is unknown"""
+        entry = self.get(file_id)
+        return entry["upload_path"] if entry else None
+
+    def remove(self, file_id):
+        """Forget a file_id and return the paths that can now be deleted.
+
+        Deduplicated uploads are shared between file_ids, so the upload path
+        is only returned once no other file_id refers to it.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                return []
+            self.conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+            shared = self.conn.execute(
+                "SELECT 1 FROM files WHERE upload_path = ? LIMIT 1", (row["upload_path"],)
+            ).fetchone()
+        return [
+            row[column] for column in PATH_COLUMNS
+            if row[column] and not (column == "upload_path" and shared)
+        ]
+
+    def least_recently_accessed(self, columns, accessed_before=None, limit=100):
+        """Entries with any of ``columns`` set, least recently accessed first.
+
+        With ``accessed_before`` (epoch seconds) only entries last accessed
+        before then are returned. Served from the accessed_at index, so the
+        cost depends on ``limit``, not on the number of stored files.
+        """
+        condition = " OR ".join(f"{column} IS NOT NULL" for column in columns if column in PATH_COLUMNS)
+        query = f"SELECT rowid, * FROM files WHERE ({condition or '1'})"
+        params = []
+        if accessed_before is not None:
+            query += " AND accessed_at < ?"
+            params.append(accessed_before)
+        query += " ORDER BY accessed_at LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def scan(self, after_rowid=0, limit=1000):
+        """Next ``limit`` entries after ``after_rowid`` in storage order.
+
+        ``owns_upload`` is true for exactly one of the entries sharing a
+        deduplicated upload, so the upload can be counted once.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT rowid, *, rowid = (SELECT MIN(rowid) FROM files AS shared "
+                "WHERE shared.upload_path = files.upload_path) AS owns_upload "
+                "FROM files WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (after_rowid, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def import_existing(self, uploads_dir, results_dir, reports_dir):
+        """One-time backfill of files stored before the registry existed.
+
+        Only runs when the registry is empty, so restarts never rescan the
+        upload directory.
+        """
+        if self.count() > 0 or not os.path.isdir(uploads_dir):
+            return 0
+
+        rows = []
+        for entry in os.scandir(uploads_dir):
+            if not entry.is_file():
+                continue
+            file_id = entry.name.rsplit(".", 1)[0]
+            result_path = os.path.join(results_dir, f"result_{file_id}.jpg")
+            data_path = os.path.join(results_dir, f"{file_id}_data.json")
+            report_path = os.path.join(reports_dir, f"crack_detection_report_{file_id}.pdf")
+            rows.append((
+                file_id,
+                os.path.join(uploads_dir, entry.name),
+                result_path if os.path.exists(result_path) else None,
+                data_path if os.path.exists(data_path) else None,
+                report_path if os.path.exists(report_path) else None,
+                datetime.fromtimestamp(entry.stat().st_mtime).isoformat(),
+                entry.stat().st_mtime
+            ))
+
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO files "
+                "(file_id, upload_path, result_path, data_path, report_path, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.execute("COMMIT")
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
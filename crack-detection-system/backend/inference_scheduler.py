@@ -0,0 +1,208 @@
+import asyncio
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept more requests"""
+
+
+class InferenceScheduler:
+    """Collects concurrent prediction requests into batched model calls.
+
+    Requests are queued and a single worker task drains the queue, closing a
+    batch once it holds ``max_batch_size`` images or ``max_wait_ms`` has passed
+    since its first image arrived. Each batch is run with one call to
+    ``predict_fn`` and every caller receives the result for its own image.
+
+    Up to ``max_concurrent_batches`` batches run at once; more than one only
+    helps when ``predict_fn`` hands batches to something that can run them in
+    parallel, such as a pool of model replicas.
+
+    Each request may name a ``group`` (such as the model that should run
+    it); a batch only holds requests of one group, and requests of another
+    group wait for the next batch. ``select_profile``, if given, is called
+    as each batch is dispatched, so every image in a batch runs with the
+    same inference settings. Batches run as
+    ``predict_fn(images, profile, group)`` and callers receive
+    ``(result, profile)``, with a profile of None without ``select_profile``.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, max_queue_size=64, max_concurrent_batches=1,
+                 select_profile=None):
+        self.predict_fn = predict_fn
+        self.select_profile = select_profile
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+
+        self.queue = None
+        # Requests taken from the queue that belong to a different group than the batch being built
+        self.deferred = deque()
+        self.worker = None
+        self.executor = None
+        self.slots = None
+        self.running_batches = set()
+
+        # Metrics
+        self.requests_total = 0
+        self.batches_total = 0
+        self.images_total = 0
+        self.errors_total = 0
+        self.rejected_total = 0
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.total_queue_wait = 0.0
+        self.total_batch_time = 0.0
+
+    async def start(self):
+        """Start the batching worker on the running event loop"""
+        if self.worker is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches, thread_name_prefix="inference")
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker and fail any requests still waiting in the queue"""
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+        if self.running_batches:
+            await asyncio.gather(*self.running_batches, return_exceptions=True)
+
+        while not self.queue.empty():
+            self.deferred.append(self.queue.get_nowait())
+        while self.deferred:
+            _, future, _, _ = self.deferred.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    async def submit(self, image, group=None):
+        """Queue a single image and wait for its (prediction result, profile).
+
+        Raises QueueFullError instead of waiting when the queue is full, so
+        callers can shed load rather than pile up behind the model.
+        """
+        if self.worker is None:
+            raise RuntimeError("Inference scheduler is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((image, future, time.perf_counter(), group))
+        except asyncio.QueueFull:
+            self.rejected_total += 1
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_size} requests waiting)")
+        self.requests_total += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return await future
+
+    async def _collect_batch(self):
+        """Wait for the first request, then gather more of its group until the batch is full or the window closes"""
+        loop = asyncio.get_running_loop()
+        batch = [self.deferred.popleft() if self.deferred else await self.queue.get()]
+        group = batch[0][3]
+        deadline = loop.time() + self.max_wait
+
+        # Deferred requests were queued first, so they join before newer ones
+        for item in [item for item in self.deferred if item[3] is group][:self.max_batch_size - 1]:
+            self.deferred.remove(item)
+            batch.append(item)
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                item = self.queue.get_nowait()
+            else:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item[3] is group:
+                batch.append(item)
+            else:
+                self.deferred.append(item)
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+
+            # Callers that gave up (e.g. client disconnected) don't need inference
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            await self.slots.acquire()
+            profile = self.select_profile() if self.select_profile is not None else None
+            task = asyncio.create_task(self._run_batch(batch, profile, batch[0][3]))
+            self.running_batches.add(task)
+            task.add_done_callback(self.running_batches.discard)
+
+    async def _run_batch(self, batch, profile, group):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        images = [image for image, _, _, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, self.predict_fn, images, profile, group)
+            if len(results) != len(images):
+                raise RuntimeError(
+                    f"Model returned {len(results)} results for a batch of {len(images)} images"
+                )
+        except Exception as e:
+            self.errors_total += 1
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+            finished = time.perf_counter()
+            self.batches_total += 1
+            self.images_total += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            self.total_batch_time += finished - started
+            self.total_queue_wait += sum(started - enqueued for _, _, enqueued, _ in batch)
+
+        for (_, future, _, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result((result, profile))
+
+    def queue_depth(self):
+        return (self.queue.qsize() if self.queue is not None else 0) + len(self.deferred)
+
+    def stats(self):
+        """Return queue and batch metrics"""
+        return {
+            "running": self.worker is not None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue_size": self.max_queue_size,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "running_batches": len(self.running_batches),
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "images_total": self.images_total,
+            "errors_total": self.errors_total,
+            "rejected_total": self.rejected_total,
+            "average_batch_size": round(self.images_total / self.batches_total, 3) if self.batches_total else 0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "average_queue_wait_ms": round(self.total_queue_wait / self.images_total * 1000, 3) if self.images_total else 0,
+            "average_batch_latency_ms": round(self.total_batch_time / self.batches_total * 1000, 3) if self.batches_total else 0,
+        }
@@ -1,7 +1,8 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from ultralytics import YOLO
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse, PlainTextResponse
+from contextlib import asynccontextmanager, contextmanager, ExitStack
+from typing import Optional
 import cv2
 import numpy as np
 from PIL import Image
@@ -9,11 +10,68 @@ import io
 import os
 import uuid
 from datetime import datetime
-from report_generator import ReportGenerator
+from report_jobs import ReportJobManager
+from inference_scheduler import InferenceScheduler, QueueFullError
+from adaptive_inference import AdaptiveProfiles, parse_profiles
+from tiling import tile_grid, read_tiles, merge_detections
+from postprocess import result_to_arrays, summarize_detections
+from annotation import render_annotated
+from file_registry import FileRegistry
+from prediction_store import PredictionStore
+from retention import RetentionManager, RetentionPolicy, path_bytes
+from metrics import StageMetrics, SlidingWindow, render_prometheus
+from batch_sources import iter_uploaded_files, open_archive, iter_archive_images
+from prediction_cache import PredictionCache
+from near_duplicates import NearDuplicateIndex
+from content_store import save_content_addressed, place_content_addressed, file_sha256
+from upload_stream import (
+    receive_image_upload, receive_upload, receive_batch_upload, sniff_video_format, image_info,
+    UploadError, UploadTooLargeError, UnsupportedFormatError
+)
+from video_frames import VideoSampler
+from model_backends import BACKENDS, load_model, model_version, ServingModel
+from model_server import ModelClient
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import hmac
+import config
 import json
 import shutil
+import time
+import zipfile
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    report_jobs.start()
+    imported = file_registry.import_existing("uploads", "results", "reports")
+    if imported:
+        print(f"Indexed {imported} existing uploads in the file registry")
+    imported = await run_blocking(prediction_store.import_json, "results")
+    if imported:
+        print(f"Imported {imported} existing predictions into the prediction store")
+    await inference_scheduler.start()
+    model_task = asyncio.create_task(warm_up_model())
+    retention_task = None
+    if config.RETENTION_INTERVAL_SECONDS > 0:
+        retention_task = asyncio.create_task(run_retention())
+    yield
+    # Shutdown
+    model_task.cancel()
+    if reload_task is not None:
+        reload_task.cancel()
+    if retention_task is not None:
+        retention_task.cancel()
+    await inference_scheduler.stop()
+    # Report completion hooks and a running retention sweep still use the
+    # registry and prediction store, so both finish before those are closed
+    await report_jobs.stop()
+    image_io_executor.shutdown(wait=True)
+    file_registry.close()
+    prediction_store.close()
 
-app = FastAPI(title="Crack Detection API", version="1.0.0")
+app = FastAPI(title="Crack Detection API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware for Angular frontend
 app.add_middleware(
@@ -24,188 +82,1394 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize YOLO model
-MODEL_PATH = "/content/drive/MyDrive/yolo-new/bridge_crack_yolov11_best.pt"
-try:
-    model = YOLO(MODEL_PATH)
-    print(f"Model loaded successfully from {MODEL_PATH}")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
+# PDF reports are built in worker processes that each keep a warm ReportGenerator.
+# They are started first thing at startup, before the model loads, so they
+# don't carry a copy of it.
+report_jobs = ReportJobManager(config.REPORT_WORKERS, config.REPORT_MP_START_METHOD)
+
+# The YOLO model is loaded and warmed up in the background once the app has
+# started, so /health answers straight away; prediction endpoints return 503
+# until model_status is "ready". serving_model is replaced as a whole when
+# new weights are hot-reloaded, so a request always sees one consistent model.
+serving_model = None
+model_status = "loading"
+model_load_seconds = None
+
+# State of the latest /admin/reload-model request, and the task running it
+model_reload = {"status": None}
+reload_task = None
+
+def load_serving_model(weights_path, backend):
+    """Load weights (or connect to the model server) and warm them up; returns a ServingModel"""
+    if config.MODEL_SERVER_ADDRESS:
+        # Batches run on the shared model server's replicas instead of a local copy
+        client = ModelClient(
+            config.MODEL_SERVER_ADDRESS,
+            config.MODEL_SERVER_AUTHKEY,
+            config.MODEL_IMGSZ,
+            config.MODEL_SERVER_CONNECT_TIMEOUT
+        )
+        serving = ServingModel(client, client.version, client.backend)
+        print(f"Using model server at {config.MODEL_SERVER_ADDRESS} "
+              f"({client.replicas} replicas, {client.backend} backend, version {serving.version})")
+    else:
+        # The version identifies the weights and backend in stored and cached predictions
+        serving = ServingModel(
+            load_model(weights_path, backend, config.MODEL_CACHE_DIR, config.MODEL_IMGSZ),
+            model_version(weights_path, backend),
+            backend,
+            weights_path
+        )
+        print(f"Model loaded from {weights_path} ({backend} backend, version {serving.version})")
+
+    # The first call initialises the runtime and picks kernels; pay for it before real
+    # requests, once per input size adaptive inference can switch to
+    predict_images([np.zeros((config.MODEL_IMGSZ, config.MODEL_IMGSZ, 3), dtype=np.uint8)], None, serving)
+    if adaptive_profiles.enabled:
+        for profile in adaptive_profiles.profiles:
+            predict_images([np.zeros((profile["imgsz"], profile["imgsz"], 3), dtype=np.uint8)], profile, serving)
+    return serving
+
+def load_and_warm_model():
+    global serving_model, model_load_seconds
+    started = time.perf_counter()
+    serving_model = load_serving_model(config.MODEL_PATH, config.INFERENCE_BACKEND)
+    model_load_seconds = time.perf_counter() - started
+    print(f"Model ready in {model_load_seconds:.2f}s")
+
+async def warm_up_model():
+    global model_status
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, load_and_warm_model)
+        model_status = "ready"
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        model_status = "failed"
+
+async def reload_model(weights_path, backend):
+    """Load and warm new weights next to the serving model, swap them in, then wait for the old one to drain.
+
+    The swap is a single assignment: requests that start afterwards use the
+    new model, requests already running finish on the old one, and the old
+    model is dropped once none are left. A reload also recovers from a
+    model that failed to load at startup.
+    """
+    global serving_model, model_status
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        serving = await loop.run_in_executor(None, load_serving_model, weights_path, backend)
+    except Exception as e:
+        print(f"Error reloading model from {weights_path}: {e}")
+        model_reload.update(status="failed", error=str(e), finished_at=datetime.now().isoformat())
+        return
+    
+    previous, serving_model = serving_model, serving
+    model_status = "ready"
+    model_reload.update(
+        status="draining",
+        version=serving.version,
+        previous_version=previous.version if previous is not None else None,
+        load_seconds=round(time.perf_counter() - started, 3)
+    )
+    swapped = time.perf_counter()
+    if previous is not None:
+        print(f"Serving model version {serving.version}; waiting for {previous.in_flight} requests "
+              f"on version {previous.version} to finish")
+        deadline = swapped + config.MODEL_DRAIN_TIMEOUT_SECONDS
+        while previous.in_flight > 0:
+            if time.perf_counter() >= deadline:
+                error = (
+                    f"{previous.in_flight} requests still running on version {previous.version} after "
+                    f"{config.MODEL_DRAIN_TIMEOUT_SECONDS:g} s; version {serving.version} is serving, "
+                    "and the old model is freed when they finish"
+                )
+                print(f"Model reload drain timed out: {error}")
+                model_reload.update(
+                    status="failed",
+                    error=error,
+                    drain_seconds=round(time.perf_counter() - swapped, 3),
+                    finished_at=datetime.now().isoformat()
+                )
+                return
+            await asyncio.sleep(0.05)
+        print(f"Model version {previous.version} released")
+    model_reload.update(
+        status="completed",
+        drain_seconds=round(time.perf_counter() - swapped, 3),
+        finished_at=datetime.now().isoformat()
+    )
+
+@contextmanager
+def model_lease():
+    """The model a request runs on, held until the request finishes.
+
+    Rejects the request until the model is loaded and warmed up.
+    """
+    if model_status == "loading":
+        raise service_unavailable("Model is still loading, please retry shortly")
+    if model_status != "ready":
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    serving = serving_model
+    serving.in_flight += 1
+    try:
+        yield serving
+    finally:
+        serving.in_flight -= 1
+
+def predict_images(images, profile=None, serving=None):
+    """Run one batch through a model; returns ((xyxy, conf, cls), speed) per image.
+
+    ``profile`` sets the model input size and confidence threshold; None
+    leaves the model's defaults. ``serving`` is the ServingModel the batch
+    was submitted for.
+    """
+    model = serving.model
+    if isinstance(model, ModelClient):
+        return model.predict(images, profile)
+    options = {"imgsz": profile["imgsz"], "conf": profile["conf"]} if profile else {}
+    return [(result_to_arrays(result), getattr(result, "speed", None) or {}) for result in model(images, **options)]
+
+# Steps the model input size and confidence threshold down while the queue
+# or latency is over its limit, and back up when load drops
+adaptive_profiles = AdaptiveProfiles(
+    parse_profiles(config.INFERENCE_PROFILES),
+    lambda: inference_scheduler.queue_depth(),
+    max_queue_depth=config.ADAPTIVE_MAX_QUEUE_DEPTH,
+    max_p95_seconds=config.ADAPTIVE_MAX_P95_MS / 1000,
+    recover_ratio=config.ADAPTIVE_RECOVER_RATIO,
+    hold_seconds=config.ADAPTIVE_HOLD_SECONDS,
+    window_seconds=config.ADAPTIVE_WINDOW_SECONDS,
+    enabled=config.ADAPTIVE_INFERENCE
+)
+
+# Batch concurrent /predict requests into a single model call. With a model
+# server, one batch per replica can be in flight at once. The profile is
+# chosen per batch, so every image in a batch runs with the same settings.
+inference_scheduler = InferenceScheduler(
+    predict_images,
+    max_batch_size=config.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=config.INFERENCE_MAX_WAIT_MS,
+    max_queue_size=config.INFERENCE_MAX_QUEUE_SIZE,
+    max_concurrent_batches=config.MODEL_REPLICAS if config.MODEL_SERVER_ADDRESS else 1,
+    select_profile=adaptive_profiles.select,
+)
+
+# Blocking image decode/encode runs here so the event loop stays responsive
+image_io_executor = ThreadPoolExecutor(max_workers=config.IMAGE_IO_WORKERS, thread_name_prefix="image-io")
+predictions_in_flight = 0
+
+# Per-stage latency histograms, and recent per-request inference latency for /health
+stage_metrics = StageMetrics()
+inference_latency = SlidingWindow(config.METRICS_WINDOW_SECONDS)
+
+# Stages the model reports for itself in result.speed (milliseconds per image)
+MODEL_SPEED_STAGES = {"preprocess": "preprocess", "inference": "inference", "postprocess": "nms"}
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the image I/O pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(image_io_executor, func, *args)
+
+def service_unavailable(detail: str):
+    """503 response telling the client when to retry"""
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)}
+    )
+
+async def run_inference(image, serving):
+    """Submit an image to be run on ``serving``; returns its (xyxy, conf, cls) detections and the profile used"""
+    started = time.perf_counter()
+    (detections, speed), profile = await inference_scheduler.submit(image, serving)
+    latency = time.perf_counter() - started
+    inference_latency.add(latency)
+    adaptive_profiles.observe(latency)
+    
+    for key, stage in MODEL_SPEED_STAGES.items():
+        if speed.get(key) is not None:
+            stage_metrics.observe(stage, speed[key] / 1000)
+    return detections, profile
+
+def degraded(profile):
+    """Whether a prediction ran below full quality; such results are not cached for reuse"""
+    return profile is not None and profile["level"] > 0
+
+async def predict_tiled(file_path, tile_size, tile_overlap, serving):
+    """Run the model over overlapping tiles and merge the boxes back into image coordinates.
+
+    Tiles are copied out of the decoded image a batch at a time, so only
+    the decode and one batch of tiles are held at once.
+    """
+    image = await run_blocking(stage_metrics.timed("decode", cv2.imread), file_path)
+    if image is None:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    
+    height, width = image.shape[:2]
+    windows = tile_grid(width, height, tile_size, tile_overlap)
+    
+    all_boxes, all_scores, all_classes = [], [], []
+    # Tiles can land in batches run under different profiles; report the most degraded
+    profile = None
+    for start in range(0, len(windows), config.TILE_BATCH_SIZE):
+        chunk = windows[start:start + config.TILE_BATCH_SIZE]
+        tiles = await run_blocking(read_tiles, image, chunk)
+        results = await asyncio.gather(*(run_inference(tile, serving) for tile in tiles))
+        del tiles
+        
+        for (x1, y1, _, _), ((boxes, scores, classes), tile_profile) in zip(chunk, results):
+            all_boxes.append(boxes + np.array([x1, y1, x1, y1], dtype=boxes.dtype))
+            all_scores.append(scores)
+            all_classes.append(classes)
+            if tile_profile is not None and (profile is None or tile_profile["level"] > profile["level"]):
+                profile = tile_profile
+        del results
+    
+    detections = await run_blocking(
+        stage_metrics.timed("postprocess", merge_detections),
+        np.concatenate(all_boxes),
+        np.concatenate(all_scores),
+        np.concatenate(all_classes),
+        config.TILE_MERGE_IOU,
+        config.TILE_MERGE_METHOD,
+        config.TILE_MERGE_METRIC
+    )
+    
+    tiling_info = {
+        "tile_size": tile_size,
+        "tile_overlap": tile_overlap,
+        "tile_count": len(windows),
+        "image_width": width,
+        "image_height": height,
+        "merge_method": config.TILE_MERGE_METHOD
+    }
+    return detections, tiling_info, profile
 
 # Create directories for uploads and results
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("results", exist_ok=True)
 os.makedirs("reports", exist_ok=True)
 
+# file_id -> stored paths, so lookups never scan the upload directory
+file_registry = FileRegistry(config.FILE_REGISTRY_PATH)
+
+# Predictions keyed by (image hash, model version, inference parameters)
+prediction_cache = PredictionCache(config.PREDICTION_CACHE_SIZE)
+
+# Perceptual hashes of recently predicted images, for reusing near-duplicate predictions
+near_duplicate_index = NearDuplicateIndex(
+    config.NEAR_DUPLICATE_INDEX_SIZE,
+    config.NEAR_DUPLICATE_MAX_DISTANCE,
+    config.NEAR_DUPLICATE_HASH
+)
+
+# Every stored prediction and its boxes, queryable across images
+prediction_store = PredictionStore(config.PREDICTION_STORE_PATH)
+
+def data_path_for(file_id):
+    """Prediction data path used before the prediction store, still removed on cleanup"""
+    return f"results/{file_id}_data.json"
+
+def save_prediction_data(response_data):
+    """Persist a prediction and its boxes in the prediction store"""
+    with stage_metrics.time("store_write"):
+        return prediction_store.save(response_data)
+
+def stored_artifacts(entry):
+    """Every file that may be stored for a registry entry, by storage area"""
+    # report_generator imports reportlab, so it is only loaded once it is needed
+    from report_generator import derivative_path
+    file_id = entry["file_id"]
+    results = {entry["result_path"], entry["data_path"], entry["cache_path"]}
+    results.update([f"results/result_{file_id}.jpg", data_path_for(file_id), result_variant_dir(file_id)])
+    reports = {entry["report_path"], f"reports/crack_detection_report_{file_id}.pdf"}
+    reports.update(
+        derivative_path(config.REPORT_DERIVATIVE_DIR, file_id, kind, config.REPORT_IMAGE_DPI, config.REPORT_JPEG_QUALITY)
+        for kind in ("original", "result")
+    )
+    reports.add(derivative_path(
+        config.REPORT_DERIVATIVE_DIR, file_id, "annotated", config.CAMPAIGN_IMAGE_DPI, config.REPORT_JPEG_QUALITY
+    ))
+    return {
+        "uploads": [entry["upload_path"]] if entry["upload_path"] else [],
+        "results": sorted(path for path in results if path),
+        "reports": sorted(path for path in reports if path)
+    }
+
+def remove_paths(paths):
+    """Delete files and directories, returning the bytes freed"""
+    freed = 0
+    for path in paths:
+        size = path_bytes(path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+        else:
+            continue
+        freed += size
+    return freed
+
+def evict_stored(entry, area):
+    """Delete a file_id's files in one storage area and return the bytes freed per area.
+
+    Evicting the upload removes all of the file_id's files, since its results
+    and reports can't be regenerated without it. Its prediction stays in the
+    prediction store, so /predictions queries still cover it.
+    """
+    file_id = entry["file_id"]
+    artifacts = stored_artifacts(entry)
+    if area == "uploads":
+        # The registry only hands back the upload once no other file_id shares it
+        removed = file_registry.remove(file_id)
+        return {
+            "uploads": remove_paths([path for path in removed if path == entry["upload_path"]]),
+            "results": remove_paths(artifacts["results"]),
+            "reports": remove_paths(artifacts["reports"])
+        }
+    if area == "results":
+        # Rendered images and caches only; the prediction itself stays queryable
+        file_registry.update(file_id, result_path=None, data_path=None, cache_path=None)
+    else:
+        file_registry.update(file_id, report_path=None)
+    return {area: remove_paths(artifacts[area])}
+
+# Background eviction of unused files by per-area TTL and byte quota
+retention_manager = RetentionManager(
+    file_registry,
+    [RetentionPolicy(area, ttl_hours * 3600, max_bytes) for area, (ttl_hours, max_bytes) in config.RETENTION_POLICIES.items()],
+    artifacts=stored_artifacts,
+    evict=evict_stored,
+    in_use=lambda file_id: report_jobs.active_job(file_id) is not None,
+    scan_batch=config.RETENTION_SCAN_BATCH,
+    evict_batch=config.RETENTION_EVICT_BATCH
+)
+
+async def run_retention():
+    """Sweep storage every RETENTION_INTERVAL_SECONDS"""
+    while True:
+        await asyncio.sleep(config.RETENTION_INTERVAL_SECONDS)
+        try:
+            await run_blocking(retention_manager.sweep)
+        except Exception as e:
+            print(f"Retention sweep failed: {e}")
+
+# Encoded result image formats: extension, media type and quality flag
+RESULT_IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+# Variant path -> render in progress, so concurrent viewers share one render
+result_renders = {}
+
+def result_variant_dir(file_id):
+    """Directory of a file_id's rendered result images, which must be directly inside RESULT_VARIANT_DIR"""
+    root = os.path.realpath(config.RESULT_VARIANT_DIR)
+    if os.path.dirname(os.path.realpath(os.path.join(root, file_id))) != root:
+        raise ValueError(f"Invalid file_id: {file_id!r}")
+    return f"{config.RESULT_VARIANT_DIR}/{file_id}"
+
+def result_variant_path(file_id, image_format, quality, max_dim):
+    """Cached path of one rendering of a file_id's annotated image"""
+    extension = RESULT_IMAGE_FORMATS[image_format][0]
+    size = f"max{max_dim}" if max_dim else "full"
+    return f"{result_variant_dir(file_id)}/{size}_q{quality}{extension}"
+
+def result_image_etag(file_id, stored_at, variant_path):
+    """ETag of a variant, derived from the stored prediction it is drawn from"""
+    tag = hashlib.sha1(f"{file_id}:{stored_at!r}:{os.path.basename(variant_path)}".encode()).hexdigest()
+    return f'"{tag[:20]}"'
+
+def render_result_variant(file_id, stored_at, variant_path, image_format, quality, max_dim):
+    """Draw the stored boxes onto the upload and encode the variant, unless a current one exists.
+
+    Returns False if the upload or prediction is missing or the image can't be decoded.
+    """
+    if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= stored_at:
+        return True
+    
+    entry = file_registry.get(file_id)
+    if entry is None or entry["upload_path"] is None or not os.path.exists(entry["upload_path"]):
+        return False
+    
+    prediction_data = prediction_store.get(file_id)
+    if prediction_data is None:
+        return False
+    # Dimensions recorded at upload save re-reading the image header
+    longest = max(entry["image_width"] or 0, entry["image_height"] or 0)
+    with stage_metrics.time("plot"):
+        annotated_image = render_annotated(entry["upload_path"], prediction_data["predictions"], max_dim, longest)
+    if annotated_image is None:
+        return False
+    
+    extension, _, quality_flag = RESULT_IMAGE_FORMATS[image_format]
+    os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+    tmp_path = f"{variant_path}.tmp{extension}"
+    with stage_metrics.time("imwrite"):
+        cv2.imwrite(tmp_path, annotated_image, [quality_flag, quality])
+        os.replace(tmp_path, variant_path)
+    # Index the variant directory so retention can find and evict it
+    file_registry.update(file_id, result_path=os.path.dirname(variant_path))
+    return True
+
+async def render_result_image(file_id, stored_at, image_format, quality, max_dim):
+    """Path of an up-to-date rendered variant, or None if it can't be rendered"""
+    variant_path = result_variant_path(file_id, image_format, quality, max_dim)
+    render = result_renders.get(variant_path)
+    if render is None:
+        render = asyncio.ensure_future(run_blocking(
+            render_result_variant, file_id, stored_at, variant_path, image_format, quality, max_dim
+        ))
+        result_renders[variant_path] = render
+        render.add_done_callback(lambda _: result_renders.pop(variant_path, None))
+    rendered = await asyncio.shield(render)
+    return variant_path if rendered else None
+
+@contextmanager
+def prediction_slot():
+    """Admit a prediction request, or reject it with 503 when too many are in flight"""
+    global predictions_in_flight
+    if predictions_in_flight >= config.MAX_INFLIGHT_PREDICTIONS:
+        raise service_unavailable("Server is busy, please retry shortly")
+    predictions_in_flight += 1
+    try:
+        yield
+    finally:
+        predictions_in_flight -= 1
+
+def build_response_data(file_id, detections, serving, profile=None):
+    """Compute overall crack metrics from (xyxy, conf, cls) arrays and assemble the prediction response"""
+    with stage_metrics.time("postprocess"):
+        predictions, crack_count, avg_confidence, crack_percentage = summarize_detections(*detections, serving.names)
+    
+    return {
+        "file_id": file_id,
+        "crack_detected": crack_count > 0,
+        "crack_count": crack_count,
+        "crack_percentage": round(crack_percentage, 2),
+        "average_confidence": round(avg_confidence, 4),
+        "predictions": predictions,
+        "result_image": f"result_{file_id}.jpg",
+        "timestamp": datetime.now().isoformat(),
+        "model_version": serving.version,
+        "inference_profile": profile,
+        "cache_hit": False
+    }
+
+def cached_response_data(file_id, cached):
+    """Prediction response for a file_id served from a cache entry"""
+    response_data = {
+        "file_id": file_id,
+        "crack_detected": cached["crack_count"] > 0,
+        "crack_count": cached["crack_count"],
+        "crack_percentage": cached["crack_percentage"],
+        "average_confidence": cached["average_confidence"],
+        "predictions": cached["predictions"],
+        "result_image": f"result_{file_id}.jpg",
+        "timestamp": datetime.now().isoformat(),
+        "model_version": cached["model_version"],
+        "inference_profile": cached.get("inference_profile"),
+        "cache_hit": True
+    }
+    if cached["tiling"] is not None:
+        response_data["tiling"] = cached["tiling"]
+    return response_data
+
+def prediction_entry(response_data):
+    """The parts of a prediction response kept by the prediction cache and the near-duplicate index"""
+    return {
+        "crack_count": response_data["crack_count"],
+        "crack_percentage": response_data["crack_percentage"],
+        "average_confidence": response_data["average_confidence"],
+        "predictions": response_data["predictions"],
+        "tiling": response_data.get("tiling"),
+        "model_version": response_data["model_version"],
+        "inference_profile": response_data.get("inference_profile")
+    }
+
+def store_prediction(file_id, response_data, cache_key):
+    """Store the prediction and cache the result.
+
+    The annotated image is not rendered here; /result-image draws it from
+    the stored boxes when it is first requested.
+    """
+    save_prediction_data(response_data)
+    
+    if not degraded(response_data["inference_profile"]):
+        prediction_cache.put(cache_key, prediction_entry(response_data))
+
+def hash_image(image):
+    """Perceptual hash of a decoded image for the near-duplicate index"""
+    with stage_metrics.time("perceptual_hash"):
+        return near_duplicate_index.hash(image)
+
+async def predict_or_reuse(file_id, image, cache_key, reuse, serving):
+    """Prediction response for a decoded image, reusing a recent near-duplicate's when allowed.
+
+    With the index enabled the image is hashed and, if ``reuse`` is set, a
+    recent prediction made under the same model version and parameters for
+    an image of the same size within NEAR_DUPLICATE_MAX_DISTANCE bits is
+    returned without inference, marked with ``near_duplicate``. Otherwise
+    the image is run through the model and, unless it ran under a degraded
+    profile, its hash is remembered.
+    """
+    image_hash = await run_blocking(hash_image, image) if near_duplicate_index.enabled else None
+    size = image.shape[:2]
+    group = cache_key[1:]
+    if reuse and image_hash is not None:
+        match = near_duplicate_index.find(image_hash, size, group)
+        if match is not None:
+            entry, distance = match
+            response_data = cached_response_data(file_id, entry)
+            response_data["near_duplicate"] = {"file_id": entry["file_id"], "distance": distance}
+            return response_data
+    
+    detections, profile = await run_inference(image, serving)
+    response_data = build_response_data(file_id, detections, serving, profile)
+    if image_hash is not None and not degraded(profile):
+        near_duplicate_index.add(image_hash, size, group, dict(prediction_entry(response_data), file_id=file_id))
+    return response_data
+
+def store_cached_prediction(file_id, response_data):
+    """Store the prediction of a cache hit for a new file_id"""
+    save_prediction_data(response_data)
+
+def store_upload_bytes(file_id, data, info):
+    """Persist in-memory upload bytes content-addressed and register the file_id"""
+    with stage_metrics.time("upload_write"):
+        file_path, content_hash, _, _ = save_content_addressed(
+            io.BytesIO(data), "uploads", info["format"], file_registry.path_for_hash
+        )
+    file_registry.register_upload(file_id, file_path, content_hash, info)
+
+def store_streamed_upload(file_id, upload):
+    """Move a streamed upload into place content-addressed and register the file_id; returns (path, duplicate)"""
+    # Reuse an identical earlier upload, otherwise rename the temporary file into place
+    try:
+        file_path, duplicate = place_content_addressed(
+            upload.tmp_path,
+            upload.content_hash,
+            "uploads",
+            upload.info["format"],
+            file_registry.path_for_hash
+        )
+    except BaseException:
+        upload.discard()
+        raise
+    file_registry.register_upload(file_id, file_path, upload.content_hash, upload.info)
+    return file_path, duplicate
+
+def persist_upload_and_prediction(file_id, data, info, response_data, cache_key, cached):
+    """Background persistence for /upload-and-predict and /predict-batch once the prediction is sent"""
+    try:
+        store_upload_bytes(file_id, data, info)
+        if cached is not None:
+            store_cached_prediction(file_id, response_data)
+        else:
+            store_prediction(file_id, response_data, cache_key)
+    except Exception as e:
+        print(f"Error persisting prediction {file_id}: {e}")
+
+def prediction_filters(since, until, min_crack_count, max_crack_count, min_crack_percentage,
+                       max_crack_percentage, class_name, min_confidence):
+    """Keyword filters for the prediction store from query parameters"""
+    return {
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "min_crack_count": min_crack_count,
+        "max_crack_count": max_crack_count,
+        "min_crack_percentage": min_crack_percentage,
+        "max_crack_percentage": max_crack_percentage,
+        "class_name": class_name,
+        "min_confidence": min_confidence
+    }
+
+def decode_image(data):
+    """Decode encoded image bytes to a BGR array, or None if they are not an image"""
+    with stage_metrics.time("decode"):
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def read_and_hash(read):
+    """Read one batch image's bytes and their content hash"""
+    data = read()
+    return data, hashlib.sha256(data).hexdigest()
+
+async def submit_when_queued(predict, *args):
+    """Await ``predict(*args)``, waiting for room in the inference queue instead of failing when it is full"""
+    while True:
+        try:
+            return await predict(*args)
+        except QueueFullError:
+            await asyncio.sleep(config.INFERENCE_MAX_WAIT_MS / 1000)
+
+async def predict_batch_image(filename, read, reuse, serving):
+    """Read, decode, predict and persist one image of a batch; returns its prediction response"""
+    file_id = str(uuid.uuid4())
+    data, content_hash = await run_blocking(read_and_hash, read)
+    info = image_info(data)
+    if info is None:
+        raise ValueError("File is not a supported image format")
+    cache_key = prediction_cache.make_key(content_hash, serving.version, {"tiled": False})
+    
+    cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        response_data = cached_response_data(file_id, cached)
+    else:
+        image = await run_blocking(decode_image, data)
+        if image is None:
+            raise ValueError("Invalid image file")
+        response_data = await submit_when_queued(predict_or_reuse, file_id, image, cache_key, reuse, serving)
+        del image
+    
+    await run_blocking(
+        persist_upload_and_prediction, file_id, data, info, response_data, cache_key, cached
+    )
+    return response_data
+
+class ClosingStreamingResponse(StreamingResponse):
+    """A StreamingResponse that closes its body and calls ``on_close`` however the response ends.
+
+    An async generator's ``finally`` only runs once it has been started and
+    then finished or closed. A client that disconnects before the first line,
+    or while a line is pending, would otherwise leave the generator suspended
+    and whatever the request holds (in-flight slot, model lease, temporary
+    files) unreleased.
+    """
+    
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                self.on_close()
+
+async def stream_batch_predictions(images, reuse, serving):
+    """Yield one NDJSON line per image as its prediction finishes.
+
+    ``BATCH_PREFETCH`` workers pull images from the shared iterator, so
+    reading and decoding the next images overlaps with inference, and their
+    concurrent submissions are grouped into model batches by the scheduler.
+    At most that many images are held in memory at once, and a slow reader
+    stalls the workers rather than letting finished lines pile up.
+    """
+    lines = asyncio.Queue(maxsize=config.BATCH_PREFETCH)
+    numbered = enumerate(images)
+    
+    async def worker():
+        for index, (filename, read) in numbered:
+            try:
+                line = {"index": index, "filename": filename, **await predict_batch_image(filename, read, reuse, serving)}
+            except Exception as e:
+                line = {"index": index, "filename": filename, "error": str(e) or e.__class__.__name__}
+            await lines.put(line)
+    
+    async def run_workers():
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, config.BATCH_PREFETCH))))
+        finally:
+            await lines.put(None)
+    
+    runner = asyncio.ensure_future(run_workers())
+    try:
+        while True:
+            line = await lines.get()
+            if line is None:
+                break
+            yield json.dumps(line) + "\n"
+        await runner
+    finally:
+        runner.cancel()
+
+def frame_prediction(frame, detections, profile, serving):
+    """NDJSON line for one sampled video frame"""
+    with stage_metrics.time("postprocess"):
+        predictions, crack_count, avg_confidence, crack_percentage = summarize_detections(*detections, serving.names)
+    return {
+        "frame_index": frame["frame_index"],
+        "timestamp": round(frame["timestamp"], 3),
+        "scene_score": round(frame["scene_score"], 4),
+        "crack_detected": crack_count > 0,
+        "crack_count": crack_count,
+        "crack_percentage": round(crack_percentage, 2),
+        "average_confidence": round(avg_confidence, 4),
+        "inference_profile": profile,
+        "predictions": predictions
+    }
+
+def finish_video(sampler, upload):
+    """Wait for the reader thread to let go of the video, then delete it"""
+    sampler.join()
+    # The reader releases the capture itself, unless the stream ended before it started
+    sampler.capture.release()
+    upload.discard()
+
+def close_video(sampler, upload):
+    """Stop the reader and delete the video in the background"""
+    sampler.stop()
+    image_io_executor.submit(finish_video, sampler, upload)
+
+async def stream_video_predictions(sampler, serving):
+    """Yield NDJSON lines: the video's properties, one per sampled frame, then a summary.
+
+    Sampled frames arrive from the reader thread through an asyncio queue.
+    Whatever has arrived, up to VIDEO_BATCH_SIZE frames, is submitted at
+    once so the scheduler runs them as one model batch, while the reader
+    keeps decoding into the free buffers of its ring.
+    """
+    loop = asyncio.get_running_loop()
+    frames = asyncio.Queue()
+    sampler.start(
+        lambda frame: loop.call_soon_threadsafe(frames.put_nowait, frame),
+        lambda: loop.call_soon_threadsafe(frames.put_nowait, None)
+    )
+    try:
+        yield json.dumps({"video": sampler.properties(), "model_version": serving.version}) + "\n"
+        finished = False
+        while not finished:
+            batch = [await frames.get()]
+            while len(batch) < config.VIDEO_BATCH_SIZE and not frames.empty():
+                batch.append(frames.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                finished = True
+            
+            results = await asyncio.gather(
+                *(submit_when_queued(run_inference, sampler.frame(frame["slot"]), serving) for frame in batch),
+                return_exceptions=True
+            )
+            for frame, result in zip(batch, results):
+                sampler.release(frame["slot"])
+                if isinstance(result, Exception):
+                    line = {"frame_index": frame["frame_index"], "error": str(result) or result.__class__.__name__}
+                else:
+                    line = frame_prediction(frame, *result, serving)
+                yield json.dumps(line) + "\n"
+        
+        yield json.dumps({
+            "done": True,
+            "frames_read": sampler.frames_read,
+            "frames_sampled": sampler.frames_sampled,
+            "error": sampler.error
+        }) + "\n"
+    finally:
+        sampler.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Crack Detection API is running"}
 
 @app.get("/health")
 async def health_check():
+    p50, p95 = inference_latency.percentiles(50, 95)
+    serving = serving_model
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
+        "model_loaded": model_status == "ready",
+        "model_status": model_status,
+        "model_load_seconds": round(model_load_seconds, 3) if model_load_seconds is not None else None,
+        "inference_backend": serving.backend if serving is not None else config.INFERENCE_BACKEND,
+        "model_version": serving.version if serving is not None else None,
+        "model_reload": model_reload["status"],
+        "inference_profile": adaptive_profiles.current(),
+        "model_server": {
+            "address": config.MODEL_SERVER_ADDRESS,
+            "replicas": serving.model.replicas
+        } if serving is not None and isinstance(serving.model, ModelClient) else None,
+        "inference_latency_ms": {
+            "p50": round(p50 * 1000, 2) if p50 is not None else None,
+            "p95": round(p95 * 1000, 2) if p95 is not None else None,
+            "samples": len(inference_latency),
+            "window_seconds": config.METRICS_WINDOW_SECONDS
+        },
         "timestamp": datetime.now().isoformat()
     }
 
-@app.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
-    """Upload an image for crack detection"""
+@app.get("/ready")
+async def readiness_check():
+    """200 once the model is loaded and warmed up, 503 before (or if loading failed)"""
+    if model_status != "ready":
+        return JSONResponse(status_code=503, content={"ready": False, "model_status": model_status})
+    return {"ready": True, "model_status": model_status, "model_version": serving_model.version}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms and service gauges in Prometheus text format"""
+    scheduler = inference_scheduler.stats()
+    cache = prediction_cache.stats()
+    duplicates = near_duplicate_index.stats()
+    adaptive = adaptive_profiles.stats()
+    p50, p95 = inference_latency.percentiles(50, 95)
+    body = render_prometheus(
+        histograms={
+            "crack_stage_duration_seconds": ("Time spent in each stage of a request", "stage", stage_metrics)
+        },
+        gauges={
+            "crack_model_loaded": ("Whether the detection model is loaded", int(model_status == "ready")),
+            "crack_inference_queue_depth": ("Images waiting for inference", scheduler["queue_depth"]),
+            "crack_inference_profile_level": ("Current inference profile (0 is full quality)", adaptive_profiles.level),
+            "crack_predictions_in_flight": ("Prediction requests being processed", predictions_in_flight),
+            "crack_inference_latency_p50_seconds": ("Median inference latency over the recent window", p50 or 0.0),
+            "crack_inference_latency_p95_seconds": ("95th percentile inference latency over the recent window", p95 or 0.0),
+        },
+        counters={
+            "crack_inference_requests_total": ("Images submitted for inference", scheduler["requests_total"]),
+            "crack_inference_batches_total": ("Model calls made by the batcher", scheduler["batches_total"]),
+            "crack_inference_rejected_total": ("Images rejected because the queue was full", scheduler["rejected_total"]),
+            "crack_prediction_cache_hits_total": ("Predictions served from the cache", cache["hits"]),
+            "crack_prediction_cache_misses_total": ("Predictions that needed inference", cache["misses"]),
+            "crack_near_duplicate_hits_total": ("Predictions reused from a near-duplicate image", duplicates["hits"]),
+            "crack_inference_profile_steps_down_total": ("Times load stepped inference down a profile", adaptive["steps_down"]),
+        }
+    )
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/inference/stats")
+async def inference_stats():
+    """Inference queue and batching metrics"""
+    stats = inference_scheduler.stats()
+    stats["predictions_in_flight"] = predictions_in_flight
+    stats["max_inflight_predictions"] = config.MAX_INFLIGHT_PREDICTIONS
+    stats["prediction_cache"] = prediction_cache.stats()
+    stats["near_duplicates"] = near_duplicate_index.stats()
+    stats["adaptive_inference"] = adaptive_profiles.stats()
+    stats["report_jobs"] = report_jobs.stats()
+    stats["retention"] = retention_manager.stats()
+    return stats
+
+# /upload parses its own multipart body, so describe the form for the API docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"]
+        }}}
+    }
+}
+
+@app.post("/upload", openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_image(request: Request):
+    """Upload an image for crack detection.
+
+    The multipart body is streamed to a temporary file as it arrives and
+    moved into place under its content hash once complete. Uploads over
+    MAX_UPLOAD_BYTES are cut off with 413 and anything that isn't a JPEG,
+    PNG, WebP, BMP or TIFF by its magic bytes with 415. The dimensions and
+    EXIF orientation are read from the bytes seen while streaming and
+    recorded in the file registry.
+    """
     try:
-        # Validate file type
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Generate unique filename
         file_id = str(uuid.uuid4())
-        file_extension = file.filename.split(".")[-1]
-        filename = f"{file_id}.{file_extension}"
-        file_path = f"uploads/{filename}"
-        
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        with stage_metrics.time("upload_write"):
+            upload = await receive_image_upload(request, "uploads", config.MAX_UPLOAD_BYTES)
+            file_path, duplicate = await run_blocking(store_streamed_upload, file_id, upload)
         
         return {
             "file_id": file_id,
-            "filename": filename,
+            "filename": os.path.basename(file_path),
+            "content_hash": upload.content_hash,
+            "size": upload.size,
+            "duplicate": duplicate,
+            "format": upload.info["format"],
+            "width": upload.info["width"],
+            "height": upload.info["height"],
+            "orientation": upload.info["orientation"],
             "message": "File uploaded successfully"
         }
     
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
 @app.post("/predict/{file_id}")
-async def predict_cracks(file_id: str):
-    """Predict cracks in the uploaded image"""
-    try:
-        if model is None:
-            raise HTTPException(status_code=500, detail="Model not loaded")
-        
-        # Find the uploaded file
-        uploaded_files = [f for f in os.listdir("uploads") if f.startswith(file_id)]
-        if not uploaded_files:
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        file_path = f"uploads/{uploaded_files[0]}"
-        
-        # Load and preprocess image
-        image = cv2.imread(file_path)
-        if image is None:
-            raise HTTPException(status_code=400, detail="Invalid image file")
-        
-        # Run YOLO prediction
-        results = model(image)
-        
-        # Process results
-        predictions = []
-        total_confidence = 0
-        crack_count = 0
-        
-        for result in results:
-            boxes = result.boxes
-            if boxes is not None:
-                for box in boxes:
-                    confidence = float(box.conf[0])
-                    class_id = int(box.cls[0])
-                    class_name = model.names[class_id]
-                    
-                    # Extract bounding box coordinates
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    
-                    predictions.append({
-                        "class": class_name,
-                        "confidence": confidence,
-                        "bbox": [x1, y1, x2, y2]
-                    })
+async def predict_cracks(
+    file_id: str,
+    tiled: bool = False,
+    tile_size: int = Query(config.TILE_SIZE, ge=64),
+    tile_overlap: float = Query(config.TILE_OVERLAP, ge=0, lt=0.95),
+    near_duplicates: bool = Query(config.NEAR_DUPLICATE_REUSE)
+):
+    """Predict cracks in the uploaded image.
+
+    With ``tiled=true`` the image is split into overlapping tiles so large
+    photos are inspected at full resolution instead of being downscaled.
+    With ``near_duplicates=true`` an image that looks the same as one
+    predicted recently (a burst or video frame) gets that prediction.
+    """
+    with prediction_slot(), model_lease() as serving:
+        try:
+            # Find the uploaded file
+            with stage_metrics.time("lookup"):
+                entry = file_registry.get(file_id)
+                if entry is None or not os.path.exists(entry["upload_path"]):
+                    raise HTTPException(status_code=404, detail="File not found")
+                file_registry.touch(file_id)
+            
+            file_path = entry["upload_path"]
+            content_hash = entry["content_hash"]
+            if content_hash is None:
+                content_hash = await run_blocking(file_sha256, file_path)
+                file_registry.set_content_hash(file_id, content_hash)
+            
+            inference_params = {"tiled": tiled}
+            if tiled:
+                inference_params.update(
+                    tile_size=tile_size,
+                    tile_overlap=tile_overlap,
+                    merge_method=config.TILE_MERGE_METHOD,
+                    merge_metric=config.TILE_MERGE_METRIC,
+                    merge_iou=config.TILE_MERGE_IOU
+                )
+            cache_key = prediction_cache.make_key(content_hash, serving.version, inference_params)
+            
+            # Serve a cached prediction without decoding or inference
+            cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                response_data = cached_response_data(file_id, cached)
+                await run_blocking(store_cached_prediction, file_id, response_data)
+                return response_data
+            
+            try:
+                if tiled:
+                    detections, tiling_info, profile = await predict_tiled(
+                        file_path, tile_size, tile_overlap, serving
+                    )
+                else:
+                    # Load and preprocess image
+                    image = await run_blocking(stage_metrics.timed("decode", cv2.imread), file_path)
+                    if image is None:
+                        raise HTTPException(status_code=400, detail="Invalid image file")
                     
-                    if class_name.lower() in ["crack", "cracks"]:
-                        total_confidence += confidence
-                        crack_count += 1
+                    # Run YOLO prediction (batched with other concurrent requests),
+                    # unless a recent near-duplicate's prediction can be reused
+                    response_data = await predict_or_reuse(file_id, image, cache_key, near_duplicates, serving)
+                    if "near_duplicate" in response_data:
+                        await run_blocking(store_cached_prediction, file_id, response_data)
+                        return response_data
+            except QueueFullError:
+                raise service_unavailable("Inference queue is full, please retry shortly")
+            
+            if tiled:
+                response_data = build_response_data(file_id, detections, serving, profile)
+                response_data["tiling"] = tiling_info
+            
+            # Save prediction data for the result image and report generation
+            await run_blocking(store_prediction, file_id, response_data, cache_key)
+            
+            return response_data
         
-        # Calculate overall crack detection metrics
-        avg_confidence = total_confidence / crack_count if crack_count > 0 else 0
-        crack_percentage = min((crack_count * avg_confidence * 100), 100)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+@app.post("/upload-and-predict", openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_and_predict(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    near_duplicates: bool = Query(config.NEAR_DUPLICATE_REUSE)
+):
+    """Upload an image and predict cracks in a single call.
+
+    The image is streamed with the same 413 and 415 checks as /upload but
+    collected in memory, which MAX_UPLOAD_BYTES bounds, so it is decoded
+    without a round trip through disk. The response is returned as soon as
+    inference finishes; the upload and prediction are stored in the
+    background afterwards.
+    """
+    with prediction_slot(), model_lease() as serving:
+        try:
+            file_id = str(uuid.uuid4())
+            with stage_metrics.time("upload_write"):
+                upload = await receive_image_upload(request, "uploads", config.MAX_UPLOAD_BYTES, in_memory=True)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UnsupportedFormatError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Save annotated image
-        annotated_image = results[0].plot()
-        result_filename = f"result_{file_id}.jpg"
-        result_path = f"results/{result_filename}"
-        cv2.imwrite(result_path, annotated_image)
+        try:
+            cache_key = prediction_cache.make_key(upload.content_hash, serving.version, {"tiled": False})
+            
+            cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                response_data = cached_response_data(file_id, cached)
+            else:
+                image = await run_blocking(decode_image, upload.data)
+                if image is None:
+                    raise HTTPException(status_code=400, detail="Invalid image file")
+            
+                try:
+                    response_data = await predict_or_reuse(file_id, image, cache_key, near_duplicates, serving)
+                except QueueFullError:
+                    raise service_unavailable("Inference queue is full, please retry shortly")
+                if "near_duplicate" in response_data:
+                    cached = response_data
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
         
-        # Prepare response
-        response_data = {
-            "file_id": file_id,
-            "crack_detected": crack_count > 0,
-            "crack_count": crack_count,
-            "crack_percentage": round(crack_percentage, 2),
-            "average_confidence": round(avg_confidence, 4),
-            "predictions": predictions,
-            "result_image": result_filename,
-            "timestamp": datetime.now().isoformat()
-        }
+        background_tasks.add_task(
+            persist_upload_and_prediction,
+            file_id,
+            upload.data,
+            upload.info,
+            response_data,
+            cache_key,
+            cached
+        )
+        return response_data
+
+BATCH_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {
+                "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                "archive": {"type": "string", "format": "binary"}
+            }
+        }}}
+    }
+}
+
+def discard_uploads(uploads):
+    for upload in uploads:
+        upload.discard()
+
+@app.post("/predict-batch", openapi_extra=BATCH_REQUEST_BODY)
+async def predict_batch(request: Request, near_duplicates: bool = Query(config.NEAR_DUPLICATE_REUSE)):
+    """Predict cracks in many images at once.
+
+    Accepts any number of ``files`` and/or a zip ``archive`` of images. The
+    body is streamed part by part to temporary files, which are deleted as
+    their images are read. Each image is stored and predicted like
+    /upload-and-predict, and one NDJSON line with its file_id and
+    prediction (or an ``error``) is streamed back as soon as it finishes, so
+    lines can arrive out of upload order; use ``index`` to match them up.
+    """
+    # The whole batch holds one in-flight slot and its model until its stream ends
+    slot = ExitStack()
+    try:
+        serving = slot.enter_context(model_lease())
+        slot.enter_context(prediction_slot())
+        try:
+            files, archive = await receive_batch_upload(
+                request, "uploads", config.BATCH_MAX_BYTES, config.BATCH_MAX_IMAGE_BYTES
+            )
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        slot.callback(discard_uploads, files + ([archive] if archive is not None else []))
+        if not files and archive is None:
+            raise HTTPException(status_code=400, detail="Provide image files or a zip archive")
         
-        # Save prediction data for report generation
-        with open(f"results/{file_id}_data.json", "w") as f:
-            json.dump(response_data, f, indent=2)
+        sources = [iter_uploaded_files(files, config.BATCH_MAX_IMAGE_BYTES)]
+        if archive is not None:
+            try:
+                zip_file = open_archive(archive.tmp_path)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="Archive must be a zip file")
+            slot.callback(zip_file.close)
+            sources.append(iter_archive_images(zip_file, config.BATCH_MAX_IMAGE_BYTES))
+    except BaseException:
+        slot.close()
+        raise
+    images = (image for source in sources for image in source)
+    
+    return ClosingStreamingResponse(
+        stream_batch_predictions(images, near_duplicates, serving),
+        on_close=slot.close,
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/predict-video", openapi_extra=UPLOAD_REQUEST_BODY)
+async def predict_video(
+    request: Request,
+    scene_threshold: float = Query(config.VIDEO_SCENE_THRESHOLD, ge=0, le=1),
+    min_interval: float = Query(config.VIDEO_MIN_INTERVAL_SECONDS, ge=0),
+    max_interval: float = Query(config.VIDEO_MAX_INTERVAL_SECONDS, gt=0)
+):
+    """Detect cracks in an inspection video.
+
+    The video (MP4, MOV, AVI or MKV/WebM) is streamed to a temporary file
+    and decoded by a background reader thread. Frames are sampled by scene
+    change: one is predicted when it differs from the last predicted frame
+    by ``scene_threshold``, at most every ``min_interval`` and at least
+    every ``max_interval`` seconds. One NDJSON line per sampled frame is
+    streamed back as its batch finishes. Nothing is stored.
+    """
+    slot = ExitStack()
+    try:
+        serving = slot.enter_context(model_lease())
+        slot.enter_context(prediction_slot())
+        try:
+            upload = await receive_upload(
+                request, "uploads", config.MAX_VIDEO_UPLOAD_BYTES, sniff_video_format, "video"
+            )
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UnsupportedFormatError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        except UploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        return response_data
+        try:
+            sampler = await run_blocking(
+                VideoSampler,
+                upload.tmp_path,
+                config.VIDEO_BUFFER_FRAMES,
+                scene_threshold,
+                min_interval,
+                max_interval
+            )
+        except ValueError as e:
+            upload.discard()
+            raise HTTPException(status_code=400, detail=str(e))
+        slot.callback(close_video, sampler, upload)
+    except BaseException:
+        slot.close()
+        raise
     
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    # The video holds one in-flight slot and its model until its stream ends
+    return ClosingStreamingResponse(
+        stream_video_predictions(sampler, serving),
+        on_close=slot.close,
+        media_type="application/x-ndjson"
+    )
+
+def require_admin(token):
+    """Reject admin requests unless ADMIN_TOKEN is set and the X-Admin-Token header matches it"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if token is None or not hmac.compare_digest(token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/admin/reload-model", status_code=202)
+async def reload_model_weights(
+    weights: Optional[str] = None,
+    backend: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Hot-reload the model from ``weights`` (default MODEL_PATH) without downtime.
+
+    The new weights are loaded and warmed up in the background while the
+    current model keeps serving, then swapped in; requests already running
+    finish on the old model. Poll GET /admin/model for progress.
+    """
+    global reload_task
+    require_admin(x_admin_token)
+    if config.MODEL_SERVER_ADDRESS:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Weights are served by the model server at {config.MODEL_SERVER_ADDRESS}; reload them there"
+        )
+    if model_status == "loading":
+        raise HTTPException(status_code=409, detail="Model is still loading")
+    if model_reload["status"] in ("loading", "draining"):
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    
+    weights_path = weights or config.MODEL_PATH
+    backend = backend or (serving_model.backend if serving_model is not None else config.INFERENCE_BACKEND)
+    if backend not in BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if not os.path.isfile(weights_path):
+        raise HTTPException(status_code=400, detail=f"Weights file not found: {weights_path}")
+    
+    model_reload.clear()
+    model_reload.update(
+        status="loading",
+        weights_path=weights_path,
+        backend=backend,
+        started_at=datetime.now().isoformat()
+    )
+    reload_task = asyncio.create_task(reload_model(weights_path, backend))
+    return {"status": "loading", "weights_path": weights_path, "backend": backend, "status_url": "/admin/model"}
+
+@app.get("/admin/model")
+async def model_details(x_admin_token: Optional[str] = Header(None)):
+    """The serving model and the state of the latest reload"""
+    require_admin(x_admin_token)
+    return {
+        "model_status": model_status,
+        "serving": serving_model.describe() if serving_model is not None else None,
+        "reload": model_reload
+    }
+
+@app.get("/predictions")
+async def query_predictions(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_crack_count: Optional[int] = Query(None, ge=0),
+    max_crack_count: Optional[int] = Query(None, ge=0),
+    min_crack_percentage: Optional[float] = Query(None, ge=0, le=100),
+    max_crack_percentage: Optional[float] = Query(None, ge=0, le=100),
+    class_name: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    include_boxes: bool = False,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """Stored predictions matching the filters, newest first.
+
+    ``class_name`` and ``min_confidence`` match predictions with at least
+    one box of that class at or above that confidence.
+    """
+    filters = prediction_filters(
+        since, until, min_crack_count, max_crack_count, min_crack_percentage,
+        max_crack_percentage, class_name, min_confidence
+    )
+    predictions = await run_blocking(
+        lambda: prediction_store.query(limit=limit, offset=offset, include_boxes=include_boxes, **filters)
+    )
+    return {"count": len(predictions), "limit": limit, "offset": offset, "predictions": predictions}
+
+@app.get("/predictions/stats")
+async def prediction_stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_crack_count: Optional[int] = Query(None, ge=0),
+    max_crack_count: Optional[int] = Query(None, ge=0),
+    min_crack_percentage: Optional[float] = Query(None, ge=0, le=100),
+    max_crack_percentage: Optional[float] = Query(None, ge=0, le=100),
+    class_name: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1)
+):
+    """Aggregate statistics over the stored predictions matching the filters"""
+    filters = prediction_filters(
+        since, until, min_crack_count, max_crack_count, min_crack_percentage,
+        max_crack_percentage, class_name, min_confidence
+    )
+    return await run_blocking(lambda: prediction_store.stats(**filters))
+
+@app.get("/predictions/{file_id}")
+async def get_prediction(file_id: str):
+    """The stored prediction for a file_id"""
+    prediction = await run_blocking(prediction_store.get, file_id)
+    if prediction is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    return prediction
 
 @app.get("/result-image/{file_id}")
-async def get_result_image(file_id: str):
-    """Get the annotated result image"""
-    result_path = f"results/result_{file_id}.jpg"
-    if not os.path.exists(result_path):
+async def get_result_image(
+    file_id: str,
+    format: str = Query(config.RESULT_IMAGE_FORMAT, pattern="^(jpeg|webp)$"),
+    quality: int = Query(config.RESULT_IMAGE_QUALITY, ge=1, le=100),
+    max_dim: Optional[int] = Query(None, ge=16, le=10000),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get the annotated result image.
+
+    The image is drawn from the stored boxes on first request and cached per
+    format, quality and maximum dimension. Responses carry an ETag, so a
+    viewer that already has the current image gets a 304.
+    """
+    stored_at = prediction_store.stored_at(file_id)
+    if stored_at is None:
+        raise HTTPException(status_code=404, detail="Result image not found")
+    file_registry.touch(file_id)
+    
+    variant_path = result_variant_path(file_id, format, quality, max_dim)
+    etag = result_image_etag(file_id, stored_at, variant_path)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    
+    if await render_result_image(file_id, stored_at, format, quality, max_dim) is None:
         raise HTTPException(status_code=404, detail="Result image not found")
     
-    return FileResponse(result_path, media_type="image/jpeg")
+    return FileResponse(variant_path, media_type=RESULT_IMAGE_FORMATS[format][1], headers=headers)
 
-@app.post("/generate-report/{file_id}")
+@app.post("/generate-report/{file_id}", status_code=202)
 async def generate_report(file_id: str):
-    """Generate a PDF report for the prediction"""
+    """Start generating a PDF report for the prediction.
+
+    The report is built in a background worker process. The response
+    carries a job id to poll at /report-jobs/{job_id}; a request for a
+    file_id whose report is already being built returns the existing job.
+    """
+    from report_generator import max_image_pixels
     try:
         # Load prediction data
-        data_path = f"results/{file_id}_data.json"
-        if not os.path.exists(data_path):
+        prediction_data = await run_blocking(prediction_store.get, file_id)
+        if prediction_data is None:
             raise HTTPException(status_code=404, detail="Prediction data not found")
+        file_registry.touch(file_id)
         
-        with open(data_path, "r") as f:
-            prediction_data = json.load(f)
-        
-        # Generate report
-        report_generator = ReportGenerator()
         report_path = f"reports/crack_detection_report_{file_id}.pdf"
+        original_image_path = file_registry.upload_path(file_id) or ""
+        # Render the annotated image just large enough for the report
+        result_image_path = await render_result_image(
+            file_id,
+            prediction_data["stored_at"],
+            "jpeg",
+            config.RESULT_IMAGE_QUALITY,
+            max_image_pixels(config.REPORT_IMAGE_DPI)
+        ) or ""
         
-        original_image_path = f"uploads/{[f for f in os.listdir('uploads') if f.startswith(file_id)][0]}"
-        result_image_path = f"results/result_{file_id}.jpg"
-        
-        report_generator.generate_report(
-            prediction_data, 
-            original_image_path, 
-            result_image_path, 
-            report_path
+        job, created = report_jobs.submit(
+            file_id,
+            prediction_data,
+            original_image_path,
+            result_image_path,
+            report_path,
+            on_complete=lambda job: file_registry.update(file_id, report_path=job["report_path"])
         )
         
         return {
             "report_id": file_id,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/report-jobs/{job['job_id']}",
             "report_path": report_path,
-            "message": "Report generated successfully"
+            "message": "Report generation started" if created else "Report generation already in progress"
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Report generation error: {str(e)}")
 
+@app.get("/report-jobs/{job_id}")
+async def get_report_job(job_id: str):
+    """Status of a report generation job"""
+    job = report_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
 @app.get("/download-report/{file_id}")
 async def download_report(file_id: str):
     """Download the generated PDF report"""
+    if report_jobs.active_job(file_id) is not None:
+        raise HTTPException(
+            status_code=409,
+            detail="Report is still being generated",
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)}
+        )
+    
     report_path = f"reports/crack_detection_report_{file_id}.pdf"
     if not os.path.exists(report_path):
         raise HTTPException(status_code=404, detail="Report not found")
+    file_registry.touch(file_id)
     
     return FileResponse(
         report_path,
@@ -213,24 +1477,102 @@ async def download_report(file_id: str):
         filename=f"crack_detection_report_{file_id}.pdf"
     )
 
+@app.post("/generate-campaign-report", status_code=202)
+async def generate_campaign_report(
+    title: Optional[str] = Query(None, max_length=200),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_crack_count: Optional[int] = Query(None, ge=0),
+    max_crack_count: Optional[int] = Query(None, ge=0),
+    min_crack_percentage: Optional[float] = Query(None, ge=0, le=100),
+    max_crack_percentage: Optional[float] = Query(None, ge=0, le=100),
+    class_name: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    limit: int = Query(config.CAMPAIGN_MAX_IMAGES, ge=1, le=config.CAMPAIGN_MAX_IMAGES)
+):
+    """Start generating one PDF report covering every stored prediction that matches the filters.
+
+    The report has a summary table, the risk distribution and a page per
+    image, and is built in a report worker like /generate-report. Poll
+    /report-jobs/{job_id}, then fetch it from
+    /download-campaign-report/{campaign_id}.
+    """
+    filters = prediction_filters(
+        since, until, min_crack_count, max_crack_count, min_crack_percentage,
+        max_crack_percentage, class_name, min_confidence
+    )
+    summaries = await run_blocking(lambda: prediction_store.query(limit=limit, **filters))
+    if not summaries:
+        raise HTTPException(status_code=404, detail="No predictions match the filters")
+    upload_paths = await run_blocking(
+        lambda: {summary["file_id"]: file_registry.upload_path(summary["file_id"]) for summary in summaries}
+    )
+    
+    campaign_id = str(uuid.uuid4())
+    report_path = f"reports/campaign_report_{campaign_id}.pdf"
+    campaign = {
+        "campaign_id": campaign_id,
+        "title": title,
+        "filters": {key: value for key, value in filters.items() if value is not None}
+    }
+    job, _ = report_jobs.submit_campaign(campaign, summaries, upload_paths, report_path)
+    
+    return {
+        "campaign_id": campaign_id,
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/report-jobs/{job['job_id']}",
+        "image_count": len(summaries),
+        "report_path": report_path,
+        "message": "Campaign report generation started"
+    }
+
+@app.get("/download-campaign-report/{campaign_id}")
+async def download_campaign_report(campaign_id: str):
+    """Download a generated campaign PDF report"""
+    if report_jobs.active_job(campaign_id) is not None:
+        raise HTTPException(
+            status_code=409,
+            detail="Report is still being generated",
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)}
+        )
+    
+    try:
+        report_path = f"reports/campaign_report_{uuid.UUID(campaign_id)}.pdf"
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if not os.path.exists(report_path):
+        raise HTTPException(status_code=404, detail="Report not found")
+    
+    return FileResponse(
+        report_path,
+        media_type="application/pdf",
+        filename=f"campaign_report_{campaign_id}.pdf"
+    )
+
 @app.delete("/cleanup/{file_id}")
 async def cleanup_files(file_id: str):
     """Clean up uploaded files and results"""
     try:
-        # Remove uploaded file
-        for file in os.listdir("uploads"):
-            if file.startswith(file_id):
-                os.remove(f"uploads/{file}")
-        
-        # Remove result files
-        for file in os.listdir("results"):
-            if file.startswith(file_id) or file.startswith(f"result_{file_id}"):
-                os.remove(f"results/{file}")
-        
-        # Remove report
-        report_path = f"reports/crack_detection_report_{file_id}.pdf"
-        if os.path.exists(report_path):
-            os.remove(report_path)
+        # file_id goes into file paths, so only registered upload ids are accepted
+        uuid.UUID(file_id)
+        entry = file_registry.get(file_id)
+    except ValueError:
+        entry = None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    # A report job is still reading the upload and result image
+    if report_jobs.active_job(file_id) is not None:
+        raise HTTPException(
+            status_code=409,
+            detail="Report is still being generated",
+            headers={"Retry-After": str(config.RETRY_AFTER_SECONDS)}
+        )
+    
+    try:
+        # Remove every file recorded for this file_id, plus the fixed-name outputs, and its prediction
+        await run_blocking(evict_stored, entry, "uploads")
+        await run_blocking(prediction_store.delete, file_id)
         
         return {"message": "Files cleaned up successfully"}
     
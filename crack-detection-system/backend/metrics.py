@@ -0,0 +1,129 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the shape Prometheus expects"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, observations <= bound) pairs, ending with +Inf"""
+        running = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+
+class SlidingWindow:
+    """Recent samples for percentiles, bounded by age and count"""
+
+    def __init__(self, window_seconds=300, max_samples=10000):
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=max_samples)
+        self.lock = threading.Lock()
+
+    def add(self, value):
+        with self.lock:
+            self.samples.append((time.monotonic(), value))
+
+    def percentiles(self, *quantiles):
+        """Percentiles (0-100) of the samples inside the window, or None for each if it is empty"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self.lock:
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+            values = [value for _, value in self.samples]
+        if not values:
+            return [None] * len(quantiles)
+        return [float(v) for v in np.percentile(values, quantiles)]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class StageMetrics:
+    """Latency histograms for the stages of a request, labelled by stage name"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def timed(self, stage, func):
+        """Wrap ``func`` so each call is recorded under ``stage``"""
+        def wrapper(*args, **kwargs):
+            with self.time(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                stage: (histogram.cumulative(), histogram.sum, histogram.count)
+                for stage, histogram in sorted(self.histograms.items())
+            }
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(histograms, gauges, counters):
+    """Render metrics in the Prometheus text exposition format.
+
+    ``histograms`` maps a metric name to ``(help, label, StageMetrics)``;
+    ``gauges`` and ``counters`` map a name to ``(help, value)``.
+    """
+    lines = []
+    for name, (help_text, label, stage_metrics) in histograms.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for stage, (buckets, total, count) in stage_metrics.snapshot().items():
+            for bound, cumulative in buckets:
+                lines.append(f'{name}_bucket{{{label}="{stage}",le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label}="{stage}"}} {_format_value(float(total))}')
+            lines.append(f'{name}_count{{{label}="{stage}"}} {count}')
+    for kind, metrics in (("gauge", gauges), ("counter", counters)):
+        for name, (help_text, value) in metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
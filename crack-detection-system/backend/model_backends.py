@@ -0,0 +1,108 @@
+import os
+import shutil
+import time
+from datetime import datetime
+from content_store import file_sha256
+
+# pytorch: the .pt weights as trained
+# onnx:    ONNX export run with ONNX Runtime
+# int8:    ONNX export with dynamically quantized INT8 weights
+# openvino: OpenVINO IR export
+BACKENDS = ("pytorch", "onnx", "int8", "openvino")
+
+
+def model_version(weights_path, backend="pytorch"):
+    """Short identifier of the weights and backend that produce a prediction"""
+    version = file_sha256(weights_path)[:12]
+    return version if backend == "pytorch" else f"{version}-{backend}"
+
+
+def artifact_dir(weights_path, cache_dir, imgsz):
+    """Cache directory for artifacts converted from these exact weights"""
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    return os.path.join(cache_dir, f"{stem}-{model_version(weights_path)}-{imgsz}")
+
+
+def export_artifact(weights_path, backend, cache_dir, imgsz=640):
+    """Return the converted model for a backend, exporting it on first use.
+
+    Exports are written under ``cache_dir`` keyed by the weights' hash and
+    input size, so a converted model is reused until the weights change.
+    """
+    target_dir = artifact_dir(weights_path, cache_dir, imgsz)
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    onnx_path = os.path.join(target_dir, f"{stem}.onnx")
+    targets = {
+        "onnx": onnx_path,
+        "int8": os.path.join(target_dir, f"{stem}-int8.onnx"),
+        "openvino": os.path.join(target_dir, f"{stem}_openvino_model"),
+    }
+    target = targets[backend]
+    if os.path.exists(target):
+        return target
+
+    from ultralytics import YOLO
+
+    # Export from a copy so artifacts land in the cache, not beside the weights
+    os.makedirs(target_dir, exist_ok=True)
+    local_weights = os.path.join(target_dir, os.path.basename(weights_path))
+    if not os.path.exists(local_weights):
+        shutil.copyfile(weights_path, local_weights)
+
+    if backend == "openvino":
+        exported = YOLO(local_weights).export(format="openvino", imgsz=imgsz, dynamic=True)
+        if os.path.abspath(exported) != os.path.abspath(target):
+            shutil.move(exported, target)
+        return target
+
+    if not os.path.exists(onnx_path):
+        exported = YOLO(local_weights).export(format="onnx", imgsz=imgsz, dynamic=True)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            shutil.move(exported, onnx_path)
+
+    if backend == "int8":
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        tmp_path = f"{target}.tmp"
+        quantize_dynamic(onnx_path, tmp_path, weight_type=QuantType.QUInt8)
+        os.replace(tmp_path, target)
+
+    return target
+
+
+def load_model(weights_path, backend="pytorch", cache_dir="model_cache", imgsz=640):
+    """Load YOLO weights for the requested inference backend"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    # ultralytics pulls in torch; importing it here keeps it off the import path of main.py
+    from ultralytics import YOLO
+    if backend == "pytorch":
+        return YOLO(weights_path)
+    return YOLO(export_artifact(weights_path, backend, cache_dir, imgsz), task="detect")
+
+
+class ServingModel:
+    """A loaded model (or model server client), the version its predictions are recorded under,
+    and how many requests are still using it.
+
+    Requests hold a model for their whole duration, so when new weights
+    are swapped in, requests already running finish on the model they
+    started with and ``in_flight`` shows when it can be released.
+    """
+
+    def __init__(self, model, version, backend, weights_path=None):
+        self.model = model
+        self.version = version
+        self.backend = backend
+        self.weights_path = weights_path
+        self.names = model.names
+        self.loaded_at = time.time()
+        self.in_flight = 0
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "backend": self.backend,
+            "weights_path": self.weights_path,
+            "loaded_at": datetime.fromtimestamp(self.loaded_at).isoformat(),
+            "in_flight": self.in_flight,
+        }
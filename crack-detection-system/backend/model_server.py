@@ -0,0 +1,300 @@
+"""Shared model server: one copy of the weights, a fixed pool of CPU replicas.
+
+Every uvicorn worker that loads the model keeps its own copy of the weights
+and its own torch thread pool, so N workers on an N-core machine run N x N
+threads. This server loads the weights once, then forks MODEL_REPLICAS
+replica processes that share the loaded weights copy-on-write. Each replica
+runs torch with a fixed intra-op thread count, optionally pinned to its own
+cores, and takes whole batches from the API workers over a Unix socket (or
+TCP). Set MODEL_SERVER_ADDRESS for the API to use it.
+
+Usage:
+    MODEL_SERVER_AUTHKEY=<secret> python model_server.py --address /tmp/crack-model.sock --replicas 4 --threads 2
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from multiprocessing.connection import Client, Listener
+import cv2
+import numpy as np
+import config
+from model_backends import BACKENDS, load_model, model_version
+from postprocess import result_to_arrays
+
+
+def parse_address(address):
+    """A Unix socket path, or a (host, port) tuple for "host:port" """
+    if ":" in address and not address.startswith(("/", ".")):
+        host, port = address.rsplit(":", 1)
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def require_authkey(authkey):
+    """The shared secret as bytes.
+
+    Requests are unpickled, so anyone who could connect without it could run
+    code in the server. There is no default; neither side starts without one.
+    """
+    if not authkey:
+        raise ValueError("MODEL_SERVER_AUTHKEY is not set; the model server requires a shared secret")
+    return authkey.encode()
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(text):
+    """CPUs in a list such as "0-3,6" """
+    cpus = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def replica_layout(replicas, threads=0, affinity="auto"):
+    """Torch thread count and CPU set (or None) for each replica.
+
+    ``threads`` of 0 divides the available cores evenly between replicas.
+    ``affinity`` is "" for no pinning, "auto" for consecutive blocks of
+    ``threads`` cores, or ";"-separated CPU lists, one per replica.
+    """
+    cpus = available_cpus()
+    replicas = max(1, replicas)
+    threads = threads if threads > 0 else max(1, len(cpus) // replicas)
+
+    if not affinity:
+        return [(threads, None)] * replicas
+    if affinity == "auto":
+        if replicas * threads > len(cpus):
+            print(f"{replicas} replicas x {threads} threads exceeds {len(cpus)} CPUs; not pinning replicas")
+            return [(threads, None)] * replicas
+        return [(threads, cpus[i * threads:(i + 1) * threads]) for i in range(replicas)]
+
+    cpu_sets = [parse_cpu_list(part) for part in affinity.split(";")]
+    if len(cpu_sets) != replicas:
+        raise ValueError(f"MODEL_REPLICA_AFFINITY lists {len(cpu_sets)} CPU sets for {replicas} replicas")
+    return [(threads, cpu_set) for cpu_set in cpu_sets]
+
+
+def set_torch_threads(threads):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def serve_replica(index, listener, model, info, threads, cpus):
+    """Replica main loop: accept a connection, run its request, reply.
+
+    All replicas block in accept() on the same listening socket, so the
+    kernel hands each new request to a replica that is idle.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    set_torch_threads(threads)
+
+    # The first call allocates buffers and picks kernels; keep it off the request path
+    model([np.zeros((64, 64, 3), dtype=np.uint8)])
+    print(f"Replica {index} ready (pid {os.getpid()}, {threads} threads, cpus {cpus or 'any'})")
+
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+            print(f"Replica {index} rejected a connection: {e}")
+            continue
+        with conn:
+            try:
+                request = conn.recv()
+                kind = request[0]
+                if kind == "predict":
+                    # Optional third element: model keyword arguments such as imgsz and conf
+                    options = request[2] if len(request) > 2 else {}
+                    results = model(request[1], **options)
+                    reply = ("ok", [(result_to_arrays(result), getattr(result, "speed", None)) for result in results])
+                elif kind == "info":
+                    reply = ("ok", info)
+                else:
+                    reply = ("error", f"Unknown request '{kind}'")
+            except (EOFError, ConnectionError):
+                continue
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            try:
+                conn.send(reply)
+            except (OSError, ConnectionError):
+                pass
+
+
+class ReplicaPool:
+    """Forked replica processes sharing one loaded model, restarted if they die"""
+
+    def __init__(self, model, info, listener, layout):
+        self.model = model
+        self.info = info
+        self.listener = listener
+        self.layout = layout
+        self.context = multiprocessing.get_context("fork")
+        self.processes = [None] * len(layout)
+
+    def start_replica(self, index):
+        threads, cpus = self.layout[index]
+        process = self.context.Process(
+            target=serve_replica,
+            args=(index, self.listener, self.model, self.info, threads, cpus),
+            name=f"replica-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(len(self.layout)):
+            self.start_replica(index)
+
+    def supervise(self, interval=1.0):
+        while True:
+            time.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    print(f"Replica {index} exited with code {process.exitcode}; restarting")
+                    self.start_replica(index)
+
+    def stop(self):
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout=5)
+
+
+class ModelClient:
+    """Model-like front end for a model server, used by the API instead of a local model.
+
+    ``predict(images, profile)`` returns ``((xyxy, conf, cls), speed)`` per
+    image. Images larger than the model input (the profile's ``imgsz`` if
+    one is given) are shrunk before they are sent, as the model would resize
+    them anyway, and the boxes are scaled back.
+    """
+
+    def __init__(self, address, authkey, imgsz=640, connect_timeout=30):
+        self.address = parse_address(address)
+        self.authkey = require_authkey(authkey)
+        self.imgsz = imgsz
+
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                info = self._call(("info",))
+                break
+            except (OSError, EOFError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+        self.names = info["names"]
+        self.version = info["version"]
+        self.backend = info["backend"]
+        self.replicas = info["replicas"]
+
+    def _call(self, request):
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send(request)
+            status, payload = conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Model server error: {payload}")
+        return payload
+
+    def _shrink(self, image, imgsz):
+        longest = max(image.shape[:2])
+        if longest <= imgsz:
+            return image, 1.0
+        scale = imgsz / longest
+        size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+    def predict(self, images, profile=None):
+        imgsz = profile["imgsz"] if profile else self.imgsz
+        options = {"imgsz": profile["imgsz"], "conf": profile["conf"]} if profile else {}
+        shrunk = [self._shrink(image, imgsz) for image in images]
+        outputs = self._call(("predict", [image for image, _ in shrunk], options))
+        results = []
+        for (_, scale), ((xyxy, conf, cls), speed) in zip(shrunk, outputs):
+            if scale != 1.0:
+                xyxy = xyxy / scale
+            results.append(((xyxy, conf, cls), speed or {}))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the crack detection model from a pool of CPU replicas")
+    parser.add_argument("--address", default=config.MODEL_SERVER_ADDRESS or "/tmp/crack-model.sock",
+                        help="Unix socket path or host:port to listen on")
+    parser.add_argument("--weights", default=config.MODEL_PATH, help="YOLO weights")
+    parser.add_argument("--backend", choices=BACKENDS, default=config.INFERENCE_BACKEND)
+    parser.add_argument("--imgsz", type=int, default=config.MODEL_IMGSZ)
+    parser.add_argument("--cache-dir", default=config.MODEL_CACHE_DIR)
+    parser.add_argument("--replicas", type=int, default=config.MODEL_REPLICAS)
+    parser.add_argument("--threads", type=int, default=config.MODEL_REPLICA_THREADS,
+                        help="torch intra-op threads per replica (0 splits the cores evenly)")
+    parser.add_argument("--affinity", default=config.MODEL_REPLICA_AFFINITY,
+                        help='"" for no pinning, "auto", or CPU sets per replica such as "0-3;4-7"')
+    args = parser.parse_args()
+    try:
+        authkey = require_authkey(config.MODEL_SERVER_AUTHKEY)
+    except ValueError as e:
+        parser.error(str(e))
+
+    layout = replica_layout(args.replicas, args.threads, args.affinity)
+    address = parse_address(args.address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)
+
+    # Loaded once here; replicas are forked afterwards and share its pages.
+    # The parent never runs inference, so no torch thread pool exists at fork time.
+    model = load_model(args.weights, args.backend, args.cache_dir, args.imgsz)
+    version = model_version(args.weights, args.backend)
+    print(f"Model loaded from {args.weights} ({args.backend} backend, version {version})")
+
+    listener = Listener(address, authkey=authkey, backlog=128)
+    info = {
+        "names": dict(model.names),
+        "version": version,
+        "backend": args.backend,
+        "replicas": len(layout),
+    }
+    pool = ReplicaPool(model, info, listener, layout)
+    pool.start()
+    print(f"Serving {len(layout)} replicas on {args.address}")
+
+    def shutdown(signum, frame):
+        pool.stop()
+        listener.close()
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    pool.supervise()
+
+
+if __name__ == "__main__":
+    main()
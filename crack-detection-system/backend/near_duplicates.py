@@ -0,0 +1,124 @@
+import threading
+import cv2
+import numpy as np
+
+HASH_METHODS = ("dhash", "phash")
+
+# Set bits in every byte value, for popcounts over the XOR of packed hashes
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def dhash(image):
+    """64-bit difference hash: whether each pixel of a 9x8 thumbnail is brighter than its right neighbour"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def phash(image):
+    """64-bit perceptual hash: signs of the 8x8 lowest DCT frequencies of a 32x32 thumbnail against their median"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # The DC term only reflects overall brightness and would skew the median
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def image_hash(image, method="dhash"):
+    if method == "phash":
+        return phash(image)
+    return dhash(image)
+
+
+class NearDuplicateIndex:
+    """Perceptual hashes of recently predicted images, for reusing their predictions.
+
+    The last ``max_entries`` hashes are kept in a ring of uint64 with the
+    image dimensions and the (model version, inference parameters) group
+    they were predicted under. A lookup XORs the new hash against the whole
+    ring and counts differing bits with a byte lookup table, so it costs a
+    few microseconds per thousand entries and never touches the images. A
+    match needs the same group and dimensions, so the stored boxes apply to
+    the new image as they are.
+    """
+
+    def __init__(self, max_entries=1024, max_distance=4, method="dhash"):
+        if method not in HASH_METHODS:
+            raise ValueError(f"Unknown hash method '{method}', expected one of {', '.join(HASH_METHODS)}")
+        self.max_entries = max(0, int(max_entries))
+        self.max_distance = max(0, int(max_distance))
+        self.method = method
+        self.hashes = np.zeros(self.max_entries, dtype=np.uint64)
+        self.sizes = np.zeros((self.max_entries, 2), dtype=np.int32)
+        self.groups = np.full(self.max_entries, -1, dtype=np.int32)
+        self.entries = [None] * self.max_entries
+        self.group_ids = {}
+        self.next_slot = 0
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def group_id(self, group):
+        """Small integer for a (model version, parameters) group, stored per entry"""
+        group_id = self.group_ids.get(group)
+        if group_id is None:
+            group_id = self.group_ids[group] = len(self.group_ids)
+        return group_id
+
+    def hash(self, image):
+        return image_hash(image, self.method)
+
+    def find(self, image_hash, size, group):
+        """Closest entry within ``max_distance`` of the hash, as (entry, distance), or None"""
+        if not self.enabled:
+            return None
+        with self.lock:
+            self.lookups += 1
+            group_id = self.group_ids.get(group)
+            if group_id is None:
+                return None
+            candidates = np.flatnonzero(
+                (self.groups == group_id) & (self.sizes[:, 0] == size[0]) & (self.sizes[:, 1] == size[1])
+            )
+            if not len(candidates):
+                return None
+            differing = self.hashes[candidates] ^ np.uint64(image_hash)
+            distances = POPCOUNT[differing.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+            best = int(np.argmin(distances))
+            distance = int(distances[best])
+            if distance > self.max_distance:
+                return None
+            self.hits += 1
+            return self.entries[candidates[best]], distance
+
+    def add(self, image_hash, size, group, entry):
+        """Remember a prediction, overwriting the oldest entry once the ring is full"""
+        if not self.enabled:
+            return
+        with self.lock:
+            slot = self.next_slot
+            self.hashes[slot] = image_hash
+            self.sizes[slot] = size
+            self.groups[slot] = self.group_id(group)
+            self.entries[slot] = entry
+            self.next_slot = (slot + 1) % self.max_entries
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": int(np.count_nonzero(self.groups >= 0)),
+                "max_entries": self.max_entries,
+                "max_distance": self.max_distance,
+                "method": self.method,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0,
+            }
@@ -0,0 +1,60 @@
+import numpy as np
+
+CRACK_CLASSES = ("crack", "cracks")
+
+
+def result_to_arrays(result):
+    """Extract (xyxy, confidence, class_id) NumPy arrays from a YOLO result"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return empty_detections()
+    return (
+        boxes.xyxy.cpu().numpy(),
+        boxes.conf.cpu().numpy(),
+        boxes.cls.cpu().numpy().astype(np.int64),
+    )
+
+
+def empty_detections():
+    return (
+        np.zeros((0, 4), dtype=np.float32),
+        np.zeros(0, dtype=np.float32),
+        np.zeros(0, dtype=np.int64),
+    )
+
+
+def class_tables(names):
+    """Lookup arrays mapping class id to its name and to whether it is a crack class"""
+    size = max(names) + 1 if names else 0
+    name_table = np.empty(size, dtype=object)
+    for class_id, class_name in names.items():
+        name_table[class_id] = class_name
+    is_crack = np.array(
+        [name is not None and name.lower() in CRACK_CLASSES for name in name_table],
+        dtype=bool
+    )
+    return name_table, is_crack
+
+
+def summarize_detections(xyxy, conf, cls, names):
+    """Turn detection arrays into API predictions and crack metrics.
+
+    Returns (predictions, crack_count, average_confidence, crack_percentage).
+    Filtering and metrics are computed on the arrays; the running sum of
+    crack confidences uses ``cumsum`` so it adds values in the same order,
+    and therefore rounds the same way, as a per-box loop would.
+    """
+    name_table, is_crack = class_tables(names)
+
+    predictions = [
+        {"class": class_name, "confidence": confidence, "bbox": bbox}
+        for class_name, confidence, bbox in zip(name_table[cls].tolist(), conf.tolist(), xyxy.tolist())
+    ]
+
+    crack_conf = conf[is_crack[cls]].astype(np.float64)
+    crack_count = int(crack_conf.size)
+    total_confidence = float(np.cumsum(crack_conf)[-1]) if crack_count else 0
+
+    average_confidence = total_confidence / crack_count if crack_count > 0 else 0
+    crack_percentage = min((crack_count * average_confidence * 100), 100)
+    return predictions, crack_count, average_confidence, crack_percentage
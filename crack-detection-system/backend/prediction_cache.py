@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Size-bounded LRU cache of prediction results.
+
+    Entries are keyed by (image content hash, model version, inference
+    parameters), so re-uploads of the same bytes can be answered without
+    decoding the image or running the model. The least recently used entry is
+    evicted once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max(0, int(max_entries))
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(content_hash, model_version, params):
+        """Build a cache key; ``params`` is a dict of the inference parameters that affect the result"""
+        return (content_hash, model_version, tuple(sorted(params.items())))
+
+    def get(self, key):
+        """Return the cached entry for a key, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        """Store an entry, evicting the least recently used ones if the cache is full"""
+        if self.max_entries == 0:
+            return
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            }
@@ -0,0 +1,251 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Prediction fields kept as columns; everything else in a response is rebuilt from them
+SUMMARY_COLUMNS = (
+    "file_id", "timestamp", "crack_detected", "crack_count", "crack_percentage",
+    "average_confidence", "model_version", "cache_hit", "tiling", "stored_at", "inference_profile"
+)
+
+
+class PredictionStore:
+    """Indexed store of predictions and their individual boxes.
+
+    Replaces the per-file ``results/{file_id}_data.json`` dumps with two
+    SQLite tables, so questions across many images ("every image with
+    crack_percentage > 50 last month") are answered from indexes instead of
+    by opening thousands of files.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                file_id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                crack_detected INTEGER NOT NULL,
+                crack_count INTEGER NOT NULL,
+                crack_percentage REAL NOT NULL,
+                average_confidence REAL NOT NULL,
+                model_version TEXT,
+                cache_hit INTEGER NOT NULL DEFAULT 0,
+                tiling TEXT,
+                stored_at REAL NOT NULL,
+                inference_profile TEXT
+            );
+            CREATE TABLE IF NOT EXISTS boxes (
+                file_id TEXT NOT NULL REFERENCES predictions (file_id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                class TEXT,
+                confidence REAL NOT NULL,
+                x1 REAL NOT NULL,
+                y1 REAL NOT NULL,
+                x2 REAL NOT NULL,
+                y2 REAL NOT NULL,
+                PRIMARY KEY (file_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_predictions_crack_count ON predictions (crack_count);
+            CREATE INDEX IF NOT EXISTS idx_predictions_crack_percentage ON predictions (crack_percentage);
+            CREATE INDEX IF NOT EXISTS idx_boxes_class_confidence ON boxes (class, confidence);
+        """)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(predictions)")}
+        if "inference_profile" not in columns:
+            self.conn.execute("ALTER TABLE predictions ADD COLUMN inference_profile TEXT")
+
+    def save(self, response_data):
+        """Insert or replace a prediction and its boxes; returns when it was stored (epoch seconds)"""
+        stored_at = time.time()
+        tiling = response_data.get("tiling")
+        profile = response_data.get("inference_profile")
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        response_data["file_id"],
+                        response_data["timestamp"],
+                        int(response_data["crack_detected"]),
+                        response_data["crack_count"],
+                        response_data["crack_percentage"],
+                        response_data["average_confidence"],
+                        response_data.get("model_version"),
+                        int(response_data.get("cache_hit", False)),
+                        json.dumps(tiling) if tiling is not None else None,
+                        stored_at,
+                        json.dumps(profile) if profile is not None else None
+                    )
+                )
+                self.conn.execute("DELETE FROM boxes WHERE file_id = ?", (response_data["file_id"],))
+                self.conn.executemany(
+                    "INSERT INTO boxes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (response_data["file_id"], position, pred["class"], pred["confidence"], *pred["bbox"])
+                        for position, pred in enumerate(response_data["predictions"])
+                    ]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return stored_at
+
+    def stored_at(self, file_id):
+        """When a file_id's prediction was last stored, or None if it has none"""
+        with self.lock:
+            row = self.conn.execute("SELECT stored_at FROM predictions WHERE file_id = ?", (file_id,)).fetchone()
+        return row["stored_at"] if row is not None else None
+
+    def get(self, file_id):
+        """The stored prediction in the shape /predict returned it, or None"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM predictions WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None:
+                return None
+            boxes = self.conn.execute(
+                "SELECT * FROM boxes WHERE file_id = ? ORDER BY position", (file_id,)
+            ).fetchall()
+        prediction = self._summary(row)
+        prediction["predictions"] = [self._box(box) for box in boxes]
+        prediction["result_image"] = f"result_{file_id}.jpg"
+        return prediction
+
+    @staticmethod
+    def _summary(row):
+        summary = {column: row[column] for column in SUMMARY_COLUMNS}
+        summary["crack_detected"] = bool(summary["crack_detected"])
+        summary["cache_hit"] = bool(summary["cache_hit"])
+        for column in ("tiling", "inference_profile"):
+            if summary[column] is not None:
+                summary[column] = json.loads(summary[column])
+            else:
+                del summary[column]
+        return summary
+
+    @staticmethod
+    def _box(row):
+        return {
+            "class": row["class"],
+            "confidence": row["confidence"],
+            "bbox": [row["x1"], row["y1"], row["x2"], row["y2"]]
+        }
+
+    @staticmethod
+    def _where(since=None, until=None, min_crack_count=None, max_crack_count=None,
+               min_crack_percentage=None, max_crack_percentage=None, class_name=None, min_confidence=None):
+        """SQL condition and parameters for prediction filters.
+
+        ``class_name`` and ``min_confidence`` select predictions with at
+        least one box matching both.
+        """
+        conditions, params = [], []
+        for column, operator, value in (
+            ("p.timestamp", ">=", since),
+            ("p.timestamp", "<", until),
+            ("p.crack_count", ">=", min_crack_count),
+            ("p.crack_count", "<=", max_crack_count),
+            ("p.crack_percentage", ">=", min_crack_percentage),
+            ("p.crack_percentage", "<=", max_crack_percentage),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+
+        if class_name is not None or min_confidence is not None:
+            box_conditions = ["b.file_id = p.file_id"]
+            if class_name is not None:
+                box_conditions.append("b.class = ?")
+                params.append(class_name)
+            if min_confidence is not None:
+                box_conditions.append("b.confidence >= ?")
+                params.append(min_confidence)
+            conditions.append(f"EXISTS (SELECT 1 FROM boxes AS b WHERE {' AND '.join(box_conditions)})")
+
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    def query(self, limit=100, offset=0, include_boxes=False, **filters):
+        """Matching predictions, newest first"""
+        where, params = self._where(**filters)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT p.* FROM predictions AS p{where} ORDER BY p.timestamp DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+            predictions = [self._summary(row) for row in rows]
+            if include_boxes:
+                for prediction in predictions:
+                    boxes = self.conn.execute(
+                        "SELECT * FROM boxes WHERE file_id = ? ORDER BY position", (prediction["file_id"],)
+                    ).fetchall()
+                    prediction["predictions"] = [self._box(box) for box in boxes]
+        return predictions
+
+    def stats(self, **filters):
+        """Aggregate statistics over the matching predictions and their boxes"""
+        where, params = self._where(**filters)
+        with self.lock:
+            totals = self.conn.execute(
+                "SELECT COUNT(*) AS predictions, COALESCE(SUM(p.crack_detected), 0) AS with_cracks, "
+                "AVG(p.crack_count) AS average_crack_count, AVG(p.crack_percentage) AS average_crack_percentage, "
+                "AVG(p.average_confidence) AS average_confidence, MAX(p.crack_percentage) AS max_crack_percentage, "
+                f"MIN(p.timestamp) AS first_timestamp, MAX(p.timestamp) AS last_timestamp FROM predictions AS p{where}",
+                params
+            ).fetchone()
+            by_class = self.conn.execute(
+                "SELECT b.class AS class, COUNT(*) AS boxes, AVG(b.confidence) AS average_confidence "
+                f"FROM boxes AS b JOIN predictions AS p ON p.file_id = b.file_id{where} "
+                "GROUP BY b.class ORDER BY boxes DESC",
+                params
+            ).fetchall()
+
+        stats = dict(totals)
+        for key in ("average_crack_count", "average_crack_percentage", "average_confidence"):
+            if stats[key] is not None:
+                stats[key] = round(stats[key], 4)
+        stats["by_class"] = {
+            row["class"]: {"boxes": row["boxes"], "average_confidence": round(row["average_confidence"], 4)}
+            for row in by_class
+        }
+        return stats
+
+    def delete(self, file_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM predictions WHERE file_id = ?", (file_id,))
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def import_json(self, results_dir):
+        """One-time import of ``{file_id}_data.json`` files written before the store existed.
+
+        Only runs when the store is empty. The JSON files are left in place.
+        """
+        if self.count() > 0 or not os.path.isdir(results_dir):
+            return 0
+
+        imported = 0
+        for entry in os.scandir(results_dir):
+            if not entry.name.endswith("_data.json"):
+                continue
+            try:
+                with open(entry.path) as f:
+                    self.save(json.load(f))
+                imported += 1
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Skipping unreadable prediction file {entry.path}: {e}")
+        return imported
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
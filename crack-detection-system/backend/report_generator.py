@@ -2,19 +2,73 @@ from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from xml.sax.saxutils import escape
 import os
+import uuid
 from PIL import Image as PILImage
-import matplotlib.pyplot as plt
-import seaborn as sns
+import cv2
 import numpy as np
+from annotation import render_annotated
+
+# Size of the image boxes in the Visual Analysis section
+IMAGE_MAX_WIDTH = 4 * inch
+IMAGE_MAX_HEIGHT = 3 * inch
+
+
+def derivative_path(derivative_dir, file_id, kind, dpi, quality):
+    """Path of the cached report-sized JPEG of an image"""
+    return os.path.join(derivative_dir, f"{file_id}_{kind}_{dpi}dpi_q{quality}.jpg")
+
+
+def temporary_path(path):
+    """Unique sibling of ``path`` to write before renaming it into place.
+
+    Report workers in different processes may prepare the same derivative at
+    once, so each writes its own file; the extension is kept for cv2.imwrite.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid()}-{uuid.uuid4().hex}.tmp{extension}"
+
+
+def max_image_pixels(dpi):
+    """Longest side in pixels an image needs to fill its report box at ``dpi``"""
+    return round(max(IMAGE_MAX_WIDTH, IMAGE_MAX_HEIGHT) / inch * dpi)
+
+
+# (crack percentage above which it applies, level, color, recommendation), highest first
+RISK_LEVELS = (
+    (80, "HIGH RISK", "red", "Immediate inspection and repair required. Structure may be compromised."),
+    (50, "MEDIUM RISK", "orange", "Schedule detailed inspection within 30 days. Monitor crack progression."),
+    (20, "LOW RISK", "yellow", "Regular monitoring recommended. Include in routine maintenance schedule."),
+    (None, "MINIMAL RISK", "green", "No immediate action required. Continue regular inspections."),
+)
+
+# Rows per summary table in a campaign report; short tables keep layout linear in the image count
+SUMMARY_ROWS_PER_TABLE = 40
+
+
+def risk_assessment(crack_percentage):
+    """(level, color, recommendation) for a crack percentage"""
+    for threshold, level, color, recommendation in RISK_LEVELS:
+        if threshold is None or crack_percentage > threshold:
+            return level, color, recommendation
+
 
 class ReportGenerator:
-    def __init__(self):
+    def __init__(self, image_dpi=150, jpeg_quality=85, derivative_dir="reports/derivatives",
+                 campaign_image_dpi=100, campaign_workers=4, campaign_max_boxes=20):
         self.styles = getSampleStyleSheet()
         self.setup_custom_styles()
+        self.image_dpi = image_dpi
+        self.jpeg_quality = jpeg_quality
+        self.derivative_dir = derivative_dir
+        self.campaign_image_dpi = campaign_image_dpi
+        self.campaign_workers = max(1, campaign_workers)
+        self.campaign_max_boxes = campaign_max_boxes
     
     def setup_custom_styles(self):
         """Setup custom styles for the report"""
@@ -42,6 +96,92 @@ class ReportGenerator:
             spaceAfter=6
         ))
     
+    def fit_size(self, width, height):
+        """Display size of an image scaled to the report's image box, keeping its aspect ratio"""
+        aspect_ratio = width / height
+        img_width = IMAGE_MAX_WIDTH
+        img_height = img_width / aspect_ratio
+        
+        if img_height > IMAGE_MAX_HEIGHT:
+            img_height = IMAGE_MAX_HEIGHT
+            img_width = img_height * aspect_ratio
+        return img_width, img_height
+    
+    def prepare_image(self, image_path, file_id, kind):
+        """Resample an image to the report's DPI and cache it as JPEG.
+
+        Returns (path, display_width, display_height). The derivative is
+        reused until the source image changes, so regenerating a report does
+        not decode and re-encode full-resolution photos again.
+        """
+        cached_path = derivative_path(self.derivative_dir, file_id, kind, self.image_dpi, self.jpeg_quality)
+        
+        # ctime also changes when a different file is linked or renamed into place
+        source_changed = max(os.stat(image_path).st_mtime, os.stat(image_path).st_ctime)
+        if os.path.exists(cached_path) and os.path.getmtime(cached_path) >= source_changed:
+            with PILImage.open(cached_path) as img:
+                return (cached_path, *self.fit_size(img.width, img.height))
+        
+        with PILImage.open(image_path) as img:
+            img_width, img_height = self.fit_size(img.width, img.height)
+            target = (
+                max(1, round(img_width / inch * self.image_dpi)),
+                max(1, round(img_height / inch * self.image_dpi))
+            )
+            # Let the JPEG decoder downscale while decoding when it can
+            img.draft("RGB", target)
+            img = img.convert("RGB")
+            if img.width > target[0] or img.height > target[1]:
+                img = img.resize(target, PILImage.LANCZOS)
+            
+            os.makedirs(self.derivative_dir, exist_ok=True)
+            tmp_path = temporary_path(cached_path)
+            try:
+                img.save(tmp_path, "JPEG", quality=self.jpeg_quality, optimize=True)
+                os.replace(tmp_path, cached_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        
+        return cached_path, img_width, img_height
+    
+    def prepare_annotated(self, image_path, prediction_data):
+        """Draw a prediction's boxes onto its image at the campaign DPI and cache it as JPEG.
+
+        Returns (path, display_width, display_height), or None if the image
+        can't be read. The derivative is redrawn when the image or the
+        stored prediction is newer than it.
+        """
+        cached_path = derivative_path(
+            self.derivative_dir, prediction_data['file_id'], "annotated", self.campaign_image_dpi, self.jpeg_quality
+        )
+        source_changed = max(os.stat(image_path).st_mtime, os.stat(image_path).st_ctime, prediction_data['stored_at'])
+        if os.path.exists(cached_path) and os.path.getmtime(cached_path) >= source_changed:
+            with PILImage.open(cached_path) as img:
+                return (cached_path, *self.fit_size(img.width, img.height))
+        
+        image = render_annotated(image_path, prediction_data['predictions'], max_image_pixels(self.campaign_image_dpi))
+        if image is None:
+            return None
+        height, width = image.shape[:2]
+        img_width, img_height = self.fit_size(width, height)
+        target = (
+            max(1, round(img_width / inch * self.campaign_image_dpi)),
+            max(1, round(img_height / inch * self.campaign_image_dpi))
+        )
+        if width > target[0] or height > target[1]:
+            image = cv2.resize(image, target, interpolation=cv2.INTER_AREA)
+        
+        os.makedirs(self.derivative_dir, exist_ok=True)
+        tmp_path = temporary_path(cached_path)
+        try:
+            cv2.imwrite(tmp_path, image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            os.replace(tmp_path, cached_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return cached_path, img_width, img_height
+    
     def generate_report(self, prediction_data, original_image_path, result_image_path, output_path):
         """Generate a comprehensive PDF report"""
         doc = SimpleDocTemplate(output_path, pagesize=A4, topMargin=0.5*inch)
@@ -92,22 +232,7 @@ class ReportGenerator:
         # Risk Assessment
         story.append(Paragraph("Risk Assessment", self.styles['CustomHeading']))
         
-        if prediction_data['crack_percentage'] > 80:
-            risk_level = "HIGH RISK"
-            risk_color = "red"
-            recommendation = "Immediate inspection and repair required. Structure may be compromised."
-        elif prediction_data['crack_percentage'] > 50:
-            risk_level = "MEDIUM RISK"
-            risk_color = "orange"
-            recommendation = "Schedule detailed inspection within 30 days. Monitor crack progression."
-        elif prediction_data['crack_percentage'] > 20:
-            risk_level = "LOW RISK"
-            risk_color = "yellow"
-            recommendation = "Regular monitoring recommended. Include in routine maintenance schedule."
-        else:
-            risk_level = "MINIMAL RISK"
-            risk_color = "green"
-            recommendation = "No immediate action required. Continue regular inspections."
+        risk_level, risk_color, recommendation = risk_assessment(prediction_data['crack_percentage'])
         
         risk_text = f"""
         <b><font color="{risk_color}">Risk Level: {risk_level}</font></b><br/>
@@ -124,17 +249,11 @@ class ReportGenerator:
         if os.path.exists(original_image_path):
             story.append(Paragraph("<b>Original Image:</b>", self.styles['CustomNormal']))
             try:
-                # Resize image to fit page
-                img = PILImage.open(original_image_path)
-                aspect_ratio = img.width / img.height
-                img_width = 4 * inch
-                img_height = img_width / aspect_ratio
-                
-                if img_height > 3 * inch:
-                    img_height = 3 * inch
-                    img_width = img_height * aspect_ratio
-                
-                original_img = Image(original_image_path, width=img_width, height=img_height)
+                # Embed a copy resampled to the report's DPI
+                image_path, img_width, img_height = self.prepare_image(
+                    original_image_path, prediction_data['file_id'], "original"
+                )
+                original_img = Image(image_path, width=img_width, height=img_height)
                 story.append(original_img)
                 story.append(Spacer(1, 10))
             except Exception as e:
@@ -144,17 +263,11 @@ class ReportGenerator:
         if os.path.exists(result_image_path):
             story.append(Paragraph("<b>Detection Results:</b>", self.styles['CustomNormal']))
             try:
-                # Resize image to fit page
-                img = PILImage.open(result_image_path)
-                aspect_ratio = img.width / img.height
-                img_width = 4 * inch
-                img_height = img_width / aspect_ratio
-                
-                if img_height > 3 * inch:
-                    img_height = 3 * inch
-                    img_width = img_height * aspect_ratio
-                
-                result_img = Image(result_image_path, width=img_width, height=img_height)
+                # Embed a copy resampled to the report's DPI
+                image_path, img_width, img_height = self.prepare_image(
+                    result_image_path, prediction_data['file_id'], "result"
+                )
+                result_img = Image(image_path, width=img_width, height=img_height)
                 story.append(result_img)
                 story.append(Spacer(1, 20))
             except Exception as e:
@@ -228,4 +341,197 @@ class ReportGenerator:
         # Build PDF
         doc.build(story)
         
-        return output_path
\ No newline at end of file
+        return output_path
+    
+    def generate_campaign_report(self, campaign, summaries, load_prediction, upload_paths, output_path):
+        """Generate one PDF covering every image of an inspection campaign.
+
+        ``summaries`` are the campaign's predictions without their boxes.
+        Each image's boxes are loaded with ``load_prediction(file_id)`` only
+        when its page is prepared, and the annotated images are drawn on a
+        thread pool as small JPEG derivatives. Pages only reference those
+        files, so memory holds the compressed derivatives reportlab embeds
+        rather than decoded photos.
+        """
+        summaries = sorted(summaries, key=lambda summary: summary['crack_percentage'], reverse=True)
+        title = campaign.get('title') or "Inspection Campaign Report"
+        doc = SimpleDocTemplate(output_path, pagesize=A4, topMargin=0.5*inch)
+        story = []
+        
+        story.append(Paragraph(escape(title), self.styles['CustomTitle']))
+        story.append(Spacer(1, 20))
+        
+        filters = ", ".join(f"{key}={value}" for key, value in campaign.get('filters', {}).items()) or "None"
+        model_versions = sorted({summary['model_version'] or 'unknown' for summary in summaries})
+        metadata_data = [
+            ['Report Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
+            ['Campaign ID:', campaign['campaign_id']],
+            ['Images:', str(len(summaries))],
+            ['Filters:', Paragraph(escape(filters), self.styles['CustomNormal'])],
+            ['Model Versions:', ", ".join(model_versions)],
+        ]
+        metadata_table = Table(metadata_data, colWidths=[2*inch, 4*inch])
+        metadata_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(metadata_table)
+        story.append(Spacer(1, 20))
+        
+        # Executive Summary
+        story.append(Paragraph("Executive Summary", self.styles['CustomHeading']))
+        with_cracks = sum(1 for summary in summaries if summary['crack_detected'])
+        total_cracks = sum(summary['crack_count'] for summary in summaries)
+        average_percentage = sum(summary['crack_percentage'] for summary in summaries) / len(summaries) if summaries else 0
+        max_percentage = summaries[0]['crack_percentage'] if summaries else 0
+        summary_text = f"""
+        <b>Images Analysed:</b> {len(summaries)}<br/>
+        <b>Images With Cracks:</b> {with_cracks}<br/>
+        <b>Total Cracks Found:</b> {total_cracks}<br/>
+        <b>Average Crack Severity:</b> {average_percentage:.2f}%<br/>
+        <b>Highest Crack Severity:</b> {max_percentage}%
+        """
+        story.append(Paragraph(summary_text, self.styles['CustomNormal']))
+        story.append(Spacer(1, 20))
+        
+        # Risk Distribution
+        story.append(Paragraph("Risk Distribution", self.styles['CustomHeading']))
+        risk_counts = {level: 0 for _, level, _, _ in RISK_LEVELS}
+        for summary in summaries:
+            risk_counts[risk_assessment(summary['crack_percentage'])[0]] += 1
+        risk_data = [['Risk Level', 'Images', 'Share', 'Recommendation']]
+        for _, level, color, recommendation in RISK_LEVELS:
+            share = risk_counts[level] / len(summaries) * 100 if summaries else 0
+            risk_data.append([
+                Paragraph(f'<b><font color="{color}">{level}</font></b>', self.styles['CustomNormal']),
+                str(risk_counts[level]),
+                f"{share:.1f}%",
+                Paragraph(recommendation, self.styles['CustomNormal'])
+            ])
+        risk_table = Table(risk_data, colWidths=[1.4*inch, 0.8*inch, 0.8*inch, 3.5*inch])
+        risk_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (2, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        story.append(risk_table)
+        
+        # Summary Table, worst images first
+        story.append(PageBreak())
+        story.append(Paragraph("Image Summary", self.styles['CustomHeading']))
+        header = ['#', 'Analysis ID', 'Timestamp', 'Cracks', 'Crack %', 'Confidence', 'Risk']
+        for start in range(0, len(summaries), SUMMARY_ROWS_PER_TABLE):
+            rows = [header]
+            for index, summary in enumerate(summaries[start:start + SUMMARY_ROWS_PER_TABLE], start + 1):
+                rows.append([
+                    str(index),
+                    summary['file_id'][:8],
+                    summary['timestamp'][:19].replace('T', ' '),
+                    str(summary['crack_count']),
+                    f"{summary['crack_percentage']}",
+                    f"{summary['average_confidence']:.3f}",
+                    risk_assessment(summary['crack_percentage'])[0]
+                ])
+            summary_table = Table(rows, colWidths=[0.4*inch, 0.9*inch, 1.5*inch, 0.7*inch, 0.8*inch, 0.9*inch, 1.2*inch], repeatRows=1)
+            summary_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 8),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige]),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+            ]))
+            story.append(summary_table)
+        
+        # Per-image pages
+        def prepare(summary):
+            prediction = load_prediction(summary['file_id']) or dict(summary, predictions=[])
+            image_path = upload_paths.get(summary['file_id'])
+            if not image_path or not os.path.exists(image_path):
+                return prediction, None, "Image not available"
+            try:
+                image = self.prepare_annotated(image_path, prediction)
+            except Exception as e:
+                return prediction, None, f"Error loading image: {str(e)}"
+            return prediction, image, None if image is not None else "Image could not be decoded"
+        
+        with ThreadPoolExecutor(max_workers=self.campaign_workers) as executor:
+            for index, (prediction, image, error) in enumerate(executor.map(prepare, summaries), 1):
+                story.append(PageBreak())
+                story.extend(self.campaign_image_page(index, len(summaries), prediction, image, error))
+        
+        def footer(canvas, doc):
+            canvas.saveState()
+            canvas.setFont('Helvetica', 8)
+            canvas.drawString(doc.leftMargin, 0.4*inch, f"{title} - page {doc.page}")
+            canvas.restoreState()
+        
+        doc.build(story, onFirstPage=footer, onLaterPages=footer)
+        
+        return output_path
+    
+    def campaign_image_page(self, index, total, prediction, image, error=None):
+        """Flowables for one image's page of a campaign report"""
+        flowables = [Paragraph(f"Image {index} of {total}", self.styles['CustomHeading'])]
+        
+        risk_level, risk_color, _ = risk_assessment(prediction['crack_percentage'])
+        details = Table([
+            ['Analysis ID:', prediction['file_id']],
+            ['Timestamp:', prediction['timestamp']],
+            ['Cracks Found:', str(prediction['crack_count'])],
+            ['Crack Severity:', f"{prediction['crack_percentage']}%"],
+            ['Average Confidence:', f"{prediction['average_confidence']:.4f}"],
+            ['Risk Level:', Paragraph(f'<b><font color="{risk_color}">{risk_level}</font></b>', self.styles['CustomNormal'])],
+        ], colWidths=[1.6*inch, 4*inch])
+        details.setStyle(TableStyle([
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+        ]))
+        flowables.extend([details, Spacer(1, 10)])
+        
+        if image is not None:
+            image_path, img_width, img_height = image
+            flowables.append(Image(image_path, width=img_width, height=img_height))
+        else:
+            flowables.append(Paragraph(error or "Image not available", self.styles['CustomNormal']))
+        flowables.append(Spacer(1, 10))
+        
+        predictions = sorted(prediction['predictions'], key=lambda pred: pred['confidence'], reverse=True)
+        if predictions:
+            detection_data = [['Class', 'Confidence Score', 'Bounding Box (x1, y1, x2, y2)']]
+            for pred in predictions[:self.campaign_max_boxes]:
+                detection_data.append([
+                    pred['class'],
+                    f"{pred['confidence']:.4f}",
+                    f"({pred['bbox'][0]:.1f}, {pred['bbox'][1]:.1f}, {pred['bbox'][2]:.1f}, {pred['bbox'][3]:.1f})"
+                ])
+            detection_table = Table(detection_data, colWidths=[1.5*inch, 1.5*inch, 2.5*inch])
+            detection_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 8),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+            ]))
+            flowables.append(detection_table)
+            if len(predictions) > self.campaign_max_boxes:
+                flowables.append(Paragraph(
+                    f"... and {len(predictions) - self.campaign_max_boxes} more detections",
+                    self.styles['CustomNormal']
+                ))
+        else:
+            flowables.append(Paragraph("No detections.", self.styles['CustomNormal']))
+        
+        return flowables
@@ -0,0 +1,203 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Per-process generator, built once when the worker starts so every job
+# reuses its stylesheet instead of rebuilding it
+_generator = None
+
+
+def _init_worker():
+    global _generator
+    import config
+    from report_generator import ReportGenerator
+    _generator = ReportGenerator(
+        image_dpi=config.REPORT_IMAGE_DPI,
+        jpeg_quality=config.REPORT_JPEG_QUALITY,
+        derivative_dir=config.REPORT_DERIVATIVE_DIR,
+        campaign_image_dpi=config.CAMPAIGN_IMAGE_DPI,
+        campaign_workers=config.CAMPAIGN_RENDER_WORKERS,
+        campaign_max_boxes=config.CAMPAIGN_MAX_BOXES
+    )
+
+
+def _ready():
+    return _generator is not None
+
+
+def _build_report(prediction_data, original_image_path, result_image_path, output_path):
+    started = time.perf_counter()
+    _generator.generate_report(prediction_data, original_image_path, result_image_path, output_path)
+    return time.perf_counter() - started
+
+
+def _build_campaign_report(campaign, summaries, upload_paths, output_path):
+    import config
+    from prediction_store import PredictionStore
+    started = time.perf_counter()
+    # Boxes are read from the store page by page as the report is assembled
+    store = PredictionStore(config.PREDICTION_STORE_PATH)
+    try:
+        _generator.generate_campaign_report(campaign, summaries, store.get, upload_paths, output_path)
+    finally:
+        store.close()
+    return time.perf_counter() - started
+
+
+class ReportJobManager:
+    """Runs PDF report generation as background jobs in a process pool.
+
+    Each job gets an id whose status can be polled. A request for a file_id
+    that already has a queued or running job returns that job instead of
+    starting a second build of the same report.
+    """
+
+    def __init__(self, max_workers=2, start_method="fork", max_finished_jobs=1000):
+        self.max_workers = max(1, int(max_workers))
+        self.start_method = start_method
+        self.max_finished_jobs = max_finished_jobs
+        self.executor = None
+        self.jobs = {}
+        self.active_by_file = {}
+        self.job_keys = {}
+        self.futures = {}
+        self.watchers = set()
+        self.lock = threading.RLock()
+
+    def start(self):
+        """Create the worker processes; each builds its generator in the background.
+
+        With the "fork" start method all workers are launched on the first
+        submission, so starting the pool before the model is loaded keeps the
+        workers from inheriting the model's memory. Startup doesn't wait for
+        the generators; a report submitted early just queues behind them.
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker
+            )
+            self.executor.submit(_ready)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def stop(self):
+        """Shut down the pool without blocking the event loop, then wait for
+        the completion hooks of the jobs that finished meanwhile, so they
+        never run after the stores they write to are closed.
+        """
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
+        if self.watchers:
+            await asyncio.gather(*self.watchers, return_exceptions=True)
+
+    def submit(self, file_id, prediction_data, original_image_path, result_image_path, output_path, on_complete=None):
+        """Queue a report build, or return the job already building this file_id's report.
+
+        ``on_complete(job)`` is called on the event loop when the report has
+        been written successfully.
+        """
+        return self._submit(
+            file_id, {"file_id": file_id}, output_path, on_complete,
+            _build_report, prediction_data, original_image_path, result_image_path, output_path
+        )
+
+    def submit_campaign(self, campaign, summaries, upload_paths, output_path):
+        """Queue a multi-image campaign report build"""
+        campaign_id = campaign["campaign_id"]
+        return self._submit(
+            campaign_id, {"campaign_id": campaign_id, "image_count": len(summaries)}, output_path, None,
+            _build_campaign_report, campaign, summaries, upload_paths, output_path
+        )
+
+    def _submit(self, key, fields, output_path, on_complete, func, *args):
+        with self.lock:
+            active_id = self.active_by_file.get(key)
+            if active_id is not None:
+                return self.status(active_id), False
+
+            job_id = str(uuid.uuid4())
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                **fields,
+                "status": "queued",
+                "report_path": output_path,
+                "created_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "duration_seconds": None,
+                "error": None
+            }
+            self.active_by_file[key] = job_id
+            self.job_keys[job_id] = key
+            future = self.executor.submit(func, *args)
+            self.futures[job_id] = future
+
+        watcher = asyncio.get_running_loop().create_task(self._watch(job_id, future, on_complete))
+        self.watchers.add(watcher)
+        watcher.add_done_callback(self.watchers.discard)
+        return self.status(job_id), True
+
+    async def _watch(self, job_id, future, on_complete):
+        try:
+            duration = await asyncio.wrap_future(future)
+        except Exception as e:
+            self._finish(job_id, "failed", error=str(e) or e.__class__.__name__)
+            return
+
+        self._finish(job_id, "completed", duration=duration)
+        if on_complete is not None:
+            try:
+                on_complete(self.status(job_id))
+            except Exception as e:
+                print(f"Report job {job_id} completion hook failed: {e}")
+
+    def _finish(self, job_id, status, duration=None, error=None):
+        with self.lock:
+            job = self.jobs[job_id]
+            job["status"] = status
+            job["finished_at"] = datetime.now().isoformat()
+            job["duration_seconds"] = round(duration, 3) if duration is not None else None
+            job["error"] = error
+            self.futures.pop(job_id, None)
+            key = self.job_keys.pop(job_id, None)
+            if self.active_by_file.get(key) == job_id:
+                del self.active_by_file[key]
+            self._prune()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("completed", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def status(self, job_id):
+        """Return a snapshot of a job, or None if it is unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            future = self.futures.get(job_id)
+        if job["status"] == "queued" and future is not None and future.running():
+            job["status"] = "running"
+        return job
+
+    def active_job(self, file_id):
+        """Return the queued or running job for a file_id (or campaign_id), if any"""
+        with self.lock:
+            job_id = self.active_by_file.get(file_id)
+        return self.status(job_id) if job_id is not None else None
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"workers": self.max_workers, "active": len(self.active_by_file), "jobs": counts}
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+# Registry columns holding each storage area's files
+AREA_COLUMNS = {
+    "uploads": ("upload_path",),
+    "results": ("result_path", "data_path", "cache_path"),
+    "reports": ("report_path",),
+}
+
+
+def path_bytes(path):
+    """Size of a file, or of every file under a directory; 0 if it is gone"""
+    try:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        total = 0
+        for entry in os.scandir(path):
+            total += path_bytes(entry.path)
+        return total
+    except OSError:
+        return 0
+
+
+class RetentionPolicy:
+    """Limits for one storage area: entries unused for ``ttl_seconds`` are
+    evicted, and while the area is above ``max_bytes`` the least recently
+    accessed entries are evicted. 0 disables either limit.
+    """
+
+    def __init__(self, area, ttl_seconds=0, max_bytes=0):
+        if area not in AREA_COLUMNS:
+            raise ValueError(f"Unknown storage area '{area}', expected one of {', '.join(AREA_COLUMNS)}")
+        self.area = area
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+
+class RetentionManager:
+    """Evicts stored files by age and size, a bounded amount of work per sweep.
+
+    Candidates come from the file registry's access-time index, so a sweep
+    never lists a directory. Area sizes are kept by an accounting scan that
+    visits ``scan_batch`` registry entries per sweep and wraps around; until
+    its first pass completes, quotas are checked against the bytes counted so
+    far. Files written since an entry was counted are picked up on the next
+    pass.
+
+    ``artifacts(entry)`` maps a registry entry to ``{area: [paths]}``,
+    ``evict(entry, area)`` removes an area's files for the entry and returns
+    ``{area: bytes reclaimed}`` for every area it freed space in, and
+    ``in_use(file_id)`` protects entries that are being worked on.
+
+    ``lock`` serialises sweeps; the counters have their own short-lived
+    ``stats_lock`` so stats() never waits for a sweep to finish.
+    """
+
+    def __init__(self, registry, policies, artifacts, evict, in_use=None, scan_batch=1000, evict_batch=200):
+        self.registry = registry
+        self.policies = list(policies)
+        self.artifacts = artifacts
+        self.evict = evict
+        self.in_use = in_use or (lambda file_id: False)
+        self.scan_batch = scan_batch
+        self.evict_batch = evict_batch
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+
+        # Accounting scan state: bytes per area from the last full pass and the current one
+        self.scan_cursor = 0
+        self.usage = {}
+        self.pending_usage = {}
+        self.passes_completed = 0
+
+        # Metrics
+        self.sweeps = 0
+        self.last_sweep_seconds = 0.0
+        self.total_sweep_seconds = 0.0
+        self.reclaimed_bytes = {area: 0 for area in AREA_COLUMNS}
+        self.evicted_entries = {policy.area: 0 for policy in self.policies}
+
+    def area_bytes(self, area):
+        """Best current estimate of an area's size"""
+        return max(self.usage.get(area, 0), self.pending_usage.get(area, 0))
+
+    def entry_bytes(self, entry):
+        sizes = {}
+        for area, paths in self.artifacts(entry).items():
+            sizes[area] = sum(path_bytes(path) for path in paths)
+        if not entry.get("owns_upload", True):
+            sizes["uploads"] = 0
+        return sizes
+
+    def account(self):
+        """Count the next batch of registry entries towards the area sizes"""
+        entries = self.registry.scan(self.scan_cursor, self.scan_batch)
+        sizes = [self.entry_bytes(entry) for entry in entries]
+        with self.stats_lock:
+            for entry_sizes in sizes:
+                for area, size in entry_sizes.items():
+                    self.pending_usage[area] = self.pending_usage.get(area, 0) + size
+            if len(entries) < self.scan_batch:
+                self.usage = self.pending_usage
+                self.pending_usage = {}
+                self.scan_cursor = 0
+                self.passes_completed += 1
+            else:
+                self.scan_cursor = entries[-1]["rowid"]
+
+    def _evict(self, entry, area):
+        if self.in_use(entry["file_id"]):
+            return False
+        freed = self.evict(entry, area)
+        with self.stats_lock:
+            # Evicting an upload also frees its results and reports, each counted in its own area
+            for freed_area, reclaimed in freed.items():
+                self.reclaimed_bytes[freed_area] += reclaimed
+                self.usage[freed_area] = max(0, self.usage.get(freed_area, 0) - reclaimed)
+                if entry["rowid"] <= self.scan_cursor:
+                    self.pending_usage[freed_area] = max(0, self.pending_usage.get(freed_area, 0) - reclaimed)
+            self.evicted_entries[area] += 1
+        return True
+
+    def enforce(self, policy, budget):
+        """Evict up to ``budget`` entries of one area; returns how many were evicted"""
+        columns = AREA_COLUMNS[policy.area]
+        evicted = 0
+
+        if policy.ttl_seconds:
+            expired = self.registry.least_recently_accessed(columns, time.time() - policy.ttl_seconds, budget)
+            evicted += sum(self._evict(entry, policy.area) for entry in expired)
+
+        if policy.max_bytes and evicted < budget and self.area_bytes(policy.area) > policy.max_bytes:
+            for entry in self.registry.least_recently_accessed(columns, limit=budget - evicted):
+                if self.area_bytes(policy.area) <= policy.max_bytes:
+                    break
+                evicted += self._evict(entry, policy.area)
+
+        return evicted
+
+    def sweep(self):
+        """One bounded round of accounting and eviction across all areas"""
+        with self.lock:
+            started = time.perf_counter()
+            self.account()
+            for policy in self.policies:
+                self.enforce(policy, self.evict_batch)
+            with self.stats_lock:
+                self.last_sweep_seconds = time.perf_counter() - started
+                self.total_sweep_seconds += self.last_sweep_seconds
+                self.sweeps += 1
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "sweeps": self.sweeps,
+                "last_sweep_ms": round(self.last_sweep_seconds * 1000, 3),
+                "average_sweep_ms": round(self.total_sweep_seconds / self.sweeps * 1000, 3) if self.sweeps else 0.0,
+                "accounting_passes": self.passes_completed,
+                "areas": {
+                    policy.area: {
+                        "ttl_seconds": policy.ttl_seconds,
+                        "max_bytes": policy.max_bytes,
+                        "bytes": self.area_bytes(policy.area),
+                        "reclaimed_bytes": self.reclaimed_bytes[policy.area],
+                        "evicted_entries": self.evicted_entries[policy.area],
+                    }
+                    for policy in self.policies
+                },
+            }
@@ -0,0 +1,137 @@
+"""Measure how long the API takes to start.
+
+Starts the server with uvicorn in a scratch directory and polls it, timing
+two moments from process start:
+
+    /health  the app is up and answering (liveness)
+    /ready   the model is loaded and warmed up (readiness)
+
+With --imports it also lists the slowest modules imported by ``import main``,
+from Python's -X importtime output, to show what still costs time before
+/health can answer.
+
+    python startup_time.py --runs 3 --imports 15
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import config
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def poll(url):
+    """(HTTP status, JSON body) of a GET, or (None, None) while nothing is listening"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+
+def measure_startup(env, workdir, timeout):
+    """Seconds from launching the server until /health and /ready return 200"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR, "--port", str(port)],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    timings = {"health_seconds": None, "ready_seconds": None}
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise SystemExit(f"Server exited with code {server.returncode} during startup")
+            if timings["health_seconds"] is None and poll(f"{base}/health")[0] == 200:
+                timings["health_seconds"] = round(time.perf_counter() - started, 3)
+            if timings["health_seconds"] is not None:
+                status, body = poll(f"{base}/ready")
+                if status == 200:
+                    timings["ready_seconds"] = round(time.perf_counter() - started, 3)
+                    break
+                if body and body.get("model_status") == "failed":
+                    print("The model failed to load; /ready will not succeed")
+                    break
+            time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return timings
+
+
+def slowest_imports(env, workdir, count):
+    """(cumulative seconds, module) of the slowest top-level imports of main.py"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=workdir, env=dict(env, PYTHONPATH=BACKEND_DIR), capture_output=True, text=True
+    )
+    # Each import is listed after the ones it triggered, indented two spaces
+    # per level, so main's own imports are the level-1 lines just before it
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            imports.append((int(cumulative) / 1e6, name.strip()))
+        elif depth == 0:
+            if name.strip() == "main":
+                return sorted(imports, reverse=True)[:count]
+            imports = []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API cold start time")
+    parser.add_argument("--runs", type=int, default=3, help="Server starts to time")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for /ready")
+    parser.add_argument("--weights", help="YOLO weights (default: MODEL_PATH)")
+    parser.add_argument("--imports", type=int, default=0, help="List this many of the slowest imports of main.py")
+    args = parser.parse_args()
+
+    env = dict(os.environ, MODEL_PATH=os.path.abspath(args.weights or config.MODEL_PATH))
+    # Nothing in the scratch directory needs sweeping during a run
+    env.setdefault("RETENTION_INTERVAL_SECONDS", "0")
+
+    workdir = tempfile.mkdtemp(prefix="crack-startup-")
+    try:
+        runs = []
+        for run in range(args.runs):
+            timings = measure_startup(env, workdir, args.timeout)
+            runs.append(timings)
+            print(f"run {run + 1}: /health {timings['health_seconds']}s  /ready {timings['ready_seconds']}s")
+
+        for key, label in (("health_seconds", "/health"), ("ready_seconds", "/ready")):
+            values = [timings[key] for timings in runs if timings[key] is not None]
+            if values:
+                print(f"{label:<8} median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s")
+
+        if args.imports:
+            print("\nSlowest imports of main.py (cumulative):")
+            for seconds, name in slowest_imports(env, workdir, args.imports):
+                print(f"  {seconds * 1000:8.1f} ms  {name}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import time
+from file_registry import FileRegistry
+from retention import RetentionManager, RetentionPolicy
+
+AREA_SIZES = {"uploads": 1_000, "results": 300, "reports": 200}
+
+
+def write(path, size):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def artifacts(entry):
+    return {
+        "uploads": [entry["upload_path"]],
+        "results": [entry["result_path"]],
+        "reports": [entry["report_path"]],
+    }
+
+
+def evict(entry, area):
+    """Like main.evict_stored: evicting the upload deletes every area's files"""
+    freed = {}
+    for freed_area, paths in artifacts(entry).items():
+        if area in ("uploads", freed_area):
+            freed[freed_area] = sum(os.path.getsize(path) for path in paths)
+            for path in paths:
+                os.remove(path)
+    return freed
+
+
+def test_upload_eviction_counts_freed_bytes_in_each_area(tmp_path):
+    registry = FileRegistry(str(tmp_path / "files.db"))
+    for file_id in ("old", "new"):
+        paths = {area: write(str(tmp_path / f"{file_id}-{area}"), size) for area, size in AREA_SIZES.items()}
+        registry.register_upload(file_id, paths["uploads"])
+        registry.update(file_id, result_path=paths["results"], report_path=paths["reports"])
+        time.sleep(0.01)
+
+    # Room for one upload, so the least recently accessed one is evicted with its results and report
+    policies = [RetentionPolicy("uploads", max_bytes=1_500), RetentionPolicy("results"), RetentionPolicy("reports")]
+    manager = RetentionManager(registry, policies, artifacts, evict)
+    manager.sweep()
+
+    areas = manager.stats()["areas"]
+    for area, size in AREA_SIZES.items():
+        assert areas[area]["bytes"] == size
+        assert areas[area]["reclaimed_bytes"] == size
+    assert areas["uploads"]["evicted_entries"] == 1
+    assert areas["results"]["evicted_entries"] == 0
+    assert not os.path.exists(tmp_path / "old-results")
+    assert os.path.exists(tmp_path / "new-results")
+    registry.close()
+
+
+def test_stats_do_not_wait_for_a_running_sweep(tmp_path):
+    registry = FileRegistry(str(tmp_path / "files.db"))
+    manager = RetentionManager(registry, [RetentionPolicy("uploads")], artifacts, evict)
+    with manager.lock:
+        assert manager.stats()["sweeps"] == 0
+    registry.close()
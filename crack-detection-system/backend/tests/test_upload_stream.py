@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import os
+import cv2
+import numpy as np
+import pytest
+from upload_stream import UploadTooLargeError, receive_batch_upload, receive_image_upload
+
+BOUNDARY = "test-boundary"
+
+
+class StreamedRequest:
+    """The parts of a Starlette request the upload receivers use"""
+
+    def __init__(self, body, chunk_size=1024, content_length=False):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+        if content_length:
+            self.headers["content-length"] = str(len(body))
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def multipart_body(parts):
+    body = b""
+    for name, filename, data in parts:
+        body += (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def receive(tmp_path, parts, max_bytes, max_image_bytes=10_000, **request_options):
+    request = StreamedRequest(multipart_body(parts), **request_options)
+    return asyncio.run(receive_batch_upload(request, str(tmp_path), max_bytes, max_image_bytes))
+
+
+def test_files_and_archive_are_streamed_to_temporary_files(tmp_path):
+    images, archive = receive(tmp_path, [
+        ("files", "a.jpg", b"a" * 100),
+        ("files", "b.jpg", b"b" * 20_000),
+        ("archive", "c.zip", b"z" * 5_000),
+    ], max_bytes=100_000)
+
+    assert [image.filename for image in images] == ["a.jpg", "b.jpg"]
+    assert [image.size for image in images] == [100, 20_000]
+    # The oversized image is cut off at the per-image cap, the archive is not
+    assert os.path.getsize(images[1].tmp_path) <= 10_000
+    assert os.path.getsize(archive.tmp_path) == 5_000
+    for upload in images + [archive]:
+        upload.discard()
+    assert os.listdir(tmp_path) == []
+
+
+def test_archive_over_the_request_cap_is_rejected_and_removed(tmp_path):
+    with pytest.raises(UploadTooLargeError):
+        receive(tmp_path, [("files", "a.jpg", b"a" * 100), ("archive", "c.zip", b"z" * 50_000)], max_bytes=20_000)
+    assert os.listdir(tmp_path) == []
+
+
+def test_many_files_over_the_request_cap_are_rejected_and_removed(tmp_path):
+    parts = [("files", f"{i}.jpg", b"x" * 1_000) for i in range(50)]
+    with pytest.raises(UploadTooLargeError):
+        receive(tmp_path, parts, max_bytes=20_000)
+    assert os.listdir(tmp_path) == []
+
+
+def test_declared_content_length_over_the_cap_is_rejected_before_reading(tmp_path):
+    with pytest.raises(UploadTooLargeError):
+        receive(tmp_path, [("archive", "c.zip", b"z" * 500_000)], max_bytes=20_000, content_length=True)
+    assert os.listdir(tmp_path) == []
+
+
+def test_in_memory_image_upload_writes_nothing_to_disk(tmp_path):
+    image = cv2.imencode(".png", np.zeros((30, 40, 3), dtype=np.uint8))[1].tobytes()
+    request = StreamedRequest(multipart_body([("file", "a.png", image)]), chunk_size=100)
+    upload = asyncio.run(receive_image_upload(request, str(tmp_path), 10_000, in_memory=True))
+
+    assert bytes(upload.data) == image
+    assert upload.content_hash == hashlib.sha256(image).hexdigest()
+    assert (upload.info["format"], upload.info["width"], upload.info["height"]) == ("png", 40, 30)
+    assert os.listdir(tmp_path) == []
+
+
+def test_in_memory_image_upload_over_the_cap_is_rejected(tmp_path):
+    request = StreamedRequest(multipart_body([("file", "a.png", b"\x89PNG\r\n\x1a\n" + b"x" * 50_000)]))
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(receive_image_upload(request, str(tmp_path), 10_000, in_memory=True))
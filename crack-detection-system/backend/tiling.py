@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """Return (x1, y1, x2, y2) windows of overlapping tiles covering the whole image"""
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def read_tiles(image, windows):
+    """Copy the given windows out of the decoded image as contiguous model inputs"""
+    return [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows]
+
+
+def box_overlap(box, boxes, metric="iou"):
+    """Overlap between one box and an array of boxes.
+
+    ``iou`` is intersection over union; ``ios`` is intersection over the
+    smaller box, which also merges a crack cut in two by a tile edge.
+    """
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if metric == "ios":
+        denominator = np.minimum(area, areas)
+    else:
+        denominator = area + areas - intersection
+    return intersection / np.maximum(denominator, 1e-9)
+
+
+def merge_detections(boxes, scores, classes, iou_threshold=0.5, method="nms", metric="iou"):
+    """Merge duplicate detections from overlapping tiles.
+
+    Boxes are visited in descending score order; each one absorbs the
+    remaining same-class boxes that overlap it by more than ``iou_threshold``.
+    With ``method="nms"`` the highest-scoring box is kept as is, with
+    ``method="wbf"`` the cluster is fused into a confidence-weighted average
+    box scored with the cluster's mean confidence.
+    """
+    if len(scores) == 0:
+        return boxes, scores, classes
+
+    order = np.argsort(-scores, kind="stable")
+    boxes, scores, classes = boxes[order], scores[order], classes[order]
+
+    merged_boxes, merged_scores, merged_classes = [], [], []
+    remaining = np.arange(len(scores))
+    while remaining.size:
+        best, rest = remaining[0], remaining[1:]
+        overlap = box_overlap(boxes[best], boxes[rest], metric)
+        cluster = (overlap > iou_threshold) & (classes[rest] == classes[best])
+
+        if method == "wbf":
+            members = np.concatenate(([best], rest[cluster]))
+            weights = scores[members]
+            merged_boxes.append((boxes[members] * weights[:, None]).sum(axis=0) / weights.sum())
+            merged_scores.append(weights.mean())
+        else:
+            merged_boxes.append(boxes[best])
+            merged_scores.append(scores[best])
+        merged_classes.append(classes[best])
+
+        remaining = rest[~cluster]
+
+    return (
+        np.stack(merged_boxes).astype(boxes.dtype),
+        np.asarray(merged_scores, dtype=scores.dtype),
+        np.asarray(merged_classes, dtype=classes.dtype),
+    )
@@ -0,0 +1,341 @@
+import hashlib
+import io
+import os
+import uuid
+import aiofiles
+from PIL import Image
+from multipart.multipart import MultipartParser, parse_options_header
+
+# Leading bytes of each accepted image format and the extension it is stored under
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+SNIFF_BYTES = 16
+
+# Leading bytes of accepted video containers; MP4/MOV are recognised by the
+# type of their first atom at offset 4
+VIDEO_SIGNATURES = (
+    (b"\x1a\x45\xdf\xa3", "mkv"),
+)
+MOV_ATOMS = (b"moov", b"mdat", b"wide", b"free")
+
+# Bytes kept in memory while streaming so the header can be parsed without
+# reading the file back; JPEG EXIF segments are at most 64 KB each
+HEADER_BYTES = 256 * 1024
+
+# Allowance for multipart boundaries and part headers when checking Content-Length
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+# EXIF orientations that rotate the image by 90 degrees, swapping width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class UploadError(Exception):
+    """Raised when an upload request is malformed"""
+
+
+class UploadTooLargeError(UploadError):
+    """Raised as soon as an upload exceeds the size limit"""
+
+
+class UnsupportedFormatError(UploadError):
+    """Raised when the uploaded bytes are not an accepted image (or video) format"""
+
+
+def sniff_image_format(head):
+    """Stored extension for the image format the leading bytes identify, or None"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def sniff_video_format(head):
+    """Stored extension for the video container the leading bytes identify, or None"""
+    if head[4:8] == b"ftyp":
+        return "mov" if head[8:10] == b"qt" else "mp4"
+    if head[4:8] in MOV_ATOMS:
+        return "mov"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    for signature, extension in VIDEO_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def read_image_header(head):
+    """Dimensions as decoded (EXIF orientation applied) and the orientation, from the leading bytes.
+
+    Returns {"width", "height", "orientation"}; the values are None when
+    the header doesn't fit in ``head`` or can't be parsed.
+    """
+    try:
+        with Image.open(io.BytesIO(head)) as img:
+            width, height = img.size
+            orientation = img.getexif().get(0x0112, 1)
+    except Exception:
+        return {"width": None, "height": None, "orientation": None}
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return {"width": width, "height": height, "orientation": orientation}
+
+
+def image_info(data):
+    """Format, dimensions and orientation of image bytes already in memory, or None if not an image"""
+    image_format = sniff_image_format(data[:SNIFF_BYTES])
+    if image_format is None:
+        return None
+    return {"format": image_format, **read_image_header(data[:HEADER_BYTES])}
+
+
+class StreamedUpload:
+    """An upload streamed to a temporary file or memory, with what was learned while receiving it"""
+
+    def __init__(self, tmp_path=None):
+        self.tmp_path = tmp_path
+        self.data = None if tmp_path else bytearray()
+        self.filename = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.head = bytearray()
+        self.info = None
+
+    @property
+    def content_hash(self):
+        return self.digest.hexdigest()
+
+    def discard(self):
+        self.data = None
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+async def receive_image_upload(request, directory, max_bytes, field_name="file", in_memory=False):
+    """Stream the image in a multipart/form-data request body to a temporary file.
+
+    The body is parsed as it arrives, so an oversized or non-image upload is
+    rejected after its first chunks instead of after it has been spooled in
+    full. Each chunk of the ``field_name`` part is hashed, written to a
+    temporary file in ``directory`` with async I/O, and its first bytes are
+    kept to sniff the format and read the dimensions and EXIF orientation,
+    so nothing re-reads the file afterwards.
+
+    With ``in_memory`` the chunks are collected in ``data`` instead, for
+    callers that decode the image straight away; ``max_bytes`` bounds it.
+
+    Returns a StreamedUpload whose ``tmp_path`` the caller must move into
+    place or discard. Raises UploadTooLargeError, UnsupportedFormatError or
+    UploadError.
+    """
+    upload = await receive_upload(request, directory, max_bytes, sniff_image_format, "image", field_name,
+                                  in_memory)
+    upload.info.update(read_image_header(bytes(upload.head)))
+    upload.head = None
+    return upload
+
+
+async def multipart_events(request):
+    """Parse a multipart/form-data request body as it arrives.
+
+    Yields ("part", {header: value}) when a part's headers are complete,
+    ("data", bytes) for each piece of its body and ("end", None) after it.
+    Raises UploadError if the body isn't multipart/form-data.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected a multipart/form-data body")
+
+    # The parser calls back synchronously; events are queued and handed out between body chunks
+    events = []
+    header = {"field": b"", "value": b""}
+    part_headers = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        part_headers[header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        events.append(("part", dict(part_headers)))
+        part_headers.clear()
+
+    def on_part_data(data, start, end):
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for event in events:
+            yield event
+        events.clear()
+    parser.finalize()
+    for event in events:
+        yield event
+
+
+def part_file(headers):
+    """(field name, filename) of a multipart part; filename is None for plain form fields"""
+    _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+    name = disposition.get(b"name", b"").decode("utf-8", "replace")
+    filename = disposition.get(b"filename")
+    return name, filename.decode("utf-8", "replace") if filename is not None else None
+
+
+async def receive_upload(request, directory, max_bytes, sniff, kind, field_name="file", in_memory=False):
+    """Stream the ``field_name`` file of a multipart/form-data body to a temporary file.
+
+    ``sniff`` maps the first SNIFF_BYTES of the file to its stored extension,
+    or None to reject it as not a supported ``kind`` ("image", "video").
+    With ``in_memory`` the file is collected in ``upload.data`` instead.
+    See receive_image_upload.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + FORM_OVERHEAD_BYTES:
+        raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+
+    if in_memory:
+        upload = StreamedUpload()
+    else:
+        upload = StreamedUpload(os.path.join(directory, f".upload-{uuid.uuid4().hex}.tmp"))
+    try:
+        if in_memory:
+            received = await receive_part(request, upload, None, max_bytes, sniff, kind, field_name)
+        else:
+            async with aiofiles.open(upload.tmp_path, "wb") as out:
+                received = await receive_part(request, upload, out, max_bytes, sniff, kind, field_name)
+
+        if not received or upload.size == 0:
+            raise UploadError(f"No file uploaded in the '{field_name}' field")
+        if upload.info is None:
+            upload_format = sniff(bytes(upload.head[:SNIFF_BYTES]))
+            if upload_format is None:
+                raise UnsupportedFormatError(f"File is not a supported {kind} format")
+            upload.info = {"format": upload_format}
+        return upload
+    except BaseException:
+        upload.discard()
+        raise
+
+
+async def receive_part(request, upload, out, max_bytes, sniff, kind, field_name):
+    """Feed the ``field_name`` file of a multipart body into ``upload``, writing to ``out`` or memory.
+
+    Returns whether the part was received in full. See receive_upload.
+    """
+    receiving = False
+    received = False
+    async for event, value in multipart_events(request):
+        if event == "part":
+            name, filename = part_file(value)
+            receiving = not received and name == field_name and filename is not None
+            if receiving:
+                upload.filename = filename
+        elif event == "data" and receiving:
+            upload.size += len(value)
+            if upload.size > max_bytes:
+                raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+            if len(upload.head) < HEADER_BYTES:
+                upload.head += value[:HEADER_BYTES - len(upload.head)]
+                if upload.info is None and len(upload.head) >= SNIFF_BYTES:
+                    upload.info = {"format": sniff(bytes(upload.head[:SNIFF_BYTES]))}
+                    if upload.info["format"] is None:
+                        raise UnsupportedFormatError(f"File is not a supported {kind} format")
+            upload.digest.update(value)
+            if out is None:
+                upload.data += value
+            else:
+                await out.write(value)
+        elif event == "end" and receiving:
+            receiving = False
+            received = True
+    return received
+
+
+async def receive_batch_upload(request, directory, max_bytes, max_image_bytes, file_fields=("files",),
+                               archive_field="archive"):
+    """Stream every image part and the zip archive part of a multipart body to temporary files.
+
+    Starlette's form parsing would spool the whole body and cap the number of
+    parts before the handler runs; here each part goes straight to its own
+    file in ``directory`` as it arrives, so memory stays flat for batches of
+    any size. Image parts stop being written once they pass
+    ``max_image_bytes`` but keep counting ``size``, so the batch can report
+    them without failing the rest. The whole body, archive included, is
+    limited to ``max_bytes``; past it every temporary file is deleted and
+    UploadTooLargeError is raised.
+
+    Returns (images, archive): StreamedUploads for the image parts in upload
+    order and for the archive, or None. The caller must discard them all.
+    Raises UploadTooLargeError or UploadError.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + FORM_OVERHEAD_BYTES:
+        raise UploadTooLargeError(f"Batch exceeds the {max_bytes} byte limit")
+
+    images = []
+    received = 0
+    archive = None
+    current = None
+    out = None
+    try:
+        try:
+            async for event, value in multipart_events(request):
+                if event == "part":
+                    name, filename = part_file(value)
+                    if filename is None or (name not in file_fields and name != archive_field):
+                        continue
+                    current = StreamedUpload(os.path.join(directory, f".upload-{uuid.uuid4().hex}.tmp"))
+                    current.filename = filename
+                    if name == archive_field:
+                        if archive is not None:
+                            current = None
+                            raise UploadError(f"Only one '{archive_field}' can be uploaded")
+                        archive = current
+                    else:
+                        images.append(current)
+                    out = await aiofiles.open(current.tmp_path, "wb")
+                elif event == "data":
+                    received += len(value)
+                    if received > max_bytes:
+                        raise UploadTooLargeError(f"Batch exceeds the {max_bytes} byte limit")
+                    if current is None:
+                        continue
+                    current.size += len(value)
+                    if current is archive or current.size <= max_image_bytes:
+                        await out.write(value)
+                elif event == "end" and current is not None:
+                    await out.close()
+                    current = out = None
+        finally:
+            if out is not None:
+                await out.close()
+        return images, archive
+    except BaseException:
+        for upload in images + [archive]:
+            if upload is not None:
+                upload.discard()
+        raise
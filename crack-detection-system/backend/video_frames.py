@@ -0,0 +1,143 @@
+import math
+import queue
+import threading
+import cv2
+
+# Size of the grayscale thumbnail frames are compared on for scene changes
+THUMBNAIL_SIZE = (64, 36)
+
+# Assumed frame rate when the container doesn't report one
+DEFAULT_FPS = 30.0
+
+
+def thumbnail(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def scene_change_score(current, previous):
+    """Mean absolute difference of two thumbnails, from 0 (identical) to 1"""
+    if previous is None:
+        return 1.0
+    return float(cv2.absdiff(current, previous).mean()) / 255
+
+
+class VideoSampler:
+    """Decodes a video in a background thread and hands over the frames worth predicting.
+
+    Frames are decoded into a fixed ring of ``buffer_frames`` buffers, so
+    memory depends on the ring size and frame size, not on the length of
+    the video. The reader decodes into a free buffer until a frame is
+    selected, then passes that buffer to ``on_frame`` and waits for a free
+    one if the consumer has fallen behind. The consumer gives each buffer
+    back with ``release`` once it is done with the frame.
+
+    Sampling is adaptive. Frames closer than ``min_interval`` seconds to the
+    last selected frame are skipped without being converted. Each later
+    frame is scored against the last selected one with scene_change_score.
+    It is selected when the score reaches ``threshold`` (the camera moved
+    on to new surface), or when ``max_interval`` seconds have passed
+    without a selection (a slow pan).
+    """
+
+    def __init__(self, path, buffer_frames=16, threshold=0.08, min_interval=0.2, max_interval=2.0):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            self.capture.release()
+            raise ValueError("Could not open the video")
+        fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and not math.isnan(fps) and fps > 0 else DEFAULT_FPS
+        self.frame_count = max(0, int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+
+        self.buffers = [None] * max(1, buffer_frames)
+        self.free = queue.Queue()
+        for slot in range(len(self.buffers)):
+            self.free.put(slot)
+        self.stopping = threading.Event()
+        self.thread = None
+
+        # Progress
+        self.frames_read = 0
+        self.frames_sampled = 0
+        self.error = None
+
+    def properties(self):
+        return {
+            "fps": round(self.fps, 3),
+            "frame_count": self.frame_count,
+            "width": self.width,
+            "height": self.height,
+            "duration": round(self.frame_count / self.fps, 3),
+        }
+
+    def start(self, on_frame, on_done):
+        """Start reading; ``on_frame(frame_info)`` per selected frame, then ``on_done()``, from the reader thread"""
+        self.thread = threading.Thread(target=self._read, args=(on_frame, on_done), name="video-reader", daemon=True)
+        self.thread.start()
+
+    def frame(self, slot):
+        return self.buffers[slot]
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def stop(self):
+        self.stopping.set()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _acquire(self):
+        """A free buffer slot, or None once stop() is called"""
+        while not self.stopping.is_set():
+            try:
+                return self.free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _read(self, on_frame, on_done):
+        slot = None
+        previous = None
+        last_selected = None
+        try:
+            while not self.stopping.is_set():
+                if slot is None:
+                    slot = self._acquire()
+                    if slot is None:
+                        break
+                index = self.frames_read
+                timestamp = index / self.fps
+                if last_selected is not None and timestamp - last_selected < self.min_interval:
+                    if not self.capture.grab():
+                        break
+                    self.frames_read += 1
+                    continue
+
+                # Decodes into the slot's buffer when its shape matches, so frames aren't reallocated
+                ok, frame = self.capture.read(self.buffers[slot])
+                if not ok:
+                    break
+                self.buffers[slot] = frame
+                self.frames_read += 1
+
+                current = thumbnail(frame)
+                score = scene_change_score(current, previous)
+                if last_selected is None or score >= self.threshold or timestamp - last_selected >= self.max_interval:
+                    previous = current
+                    last_selected = timestamp
+                    self.frames_sampled += 1
+                    on_frame({"slot": slot, "frame_index": index, "timestamp": timestamp, "scene_score": score})
+                    slot = None
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.capture.release()
+            on_done()
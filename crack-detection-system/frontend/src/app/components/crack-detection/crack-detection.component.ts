@@ -2,6 +2,8 @@ import { Component, OnInit } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { HttpClientModule } from '@angular/common/http';
 import { FormsModule } from '@angular/forms';
+import { timer } from 'rxjs';
+import { switchMap, takeWhile, last } from 'rxjs/operators';
 import { CrackDetectionService, PredictionResult, UploadResponse } from '../../services/crack-detection.service';
 
 @Component({
@@ -174,10 +176,21 @@ export class CrackDetectionComponent implements OnInit {
     this.isGeneratingReport = true;
     this.clearMessages();
 
-    this.crackDetectionService.generateReport(this.uploadedFileId).subscribe({
-      next: (response) => {
+    // Reports are built in the background; poll the job until it finishes
+    this.crackDetectionService.generateReport(this.uploadedFileId).pipe(
+      switchMap((response) => timer(0, 1000).pipe(
+        switchMap(() => this.crackDetectionService.getReportJob(response.job_id)),
+        takeWhile((job) => job.status === 'queued' || job.status === 'running', true),
+        last()
+      ))
+    ).subscribe({
+      next: (job) => {
         this.isGeneratingReport = false;
-        this.downloadReport();
+        if (job.status === 'completed') {
+          this.downloadReport();
+        } else {
+          this.showError(`Report generation failed: ${job.error || 'Unknown error'}`);
+        }
       },
       error: (error) => {
         this.isGeneratingReport = false;
@@ -26,10 +26,24 @@ export interface UploadResponse {
 
 export interface ReportResponse {
   report_id: string;
+  job_id: string;
+  status: string;
+  status_url: string;
   report_path: string;
   message: string;
 }
 
+export interface ReportJob {
+  job_id: string;
+  file_id: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  report_path: string;
+  created_at: string;
+  finished_at: string | null;
+  duration_seconds: number | null;
+  error: string | null;
+}
+
 @Injectable({
   providedIn: 'root'
 })
@@ -66,6 +80,13 @@ export class CrackDetectionService {
       );
   }
 
+  getReportJob(jobId: string): Observable<ReportJob> {
+    return this.http.get<ReportJob>(`${this.apiUrl}/report-jobs/${jobId}`)
+      .pipe(
+        catchError(this.handleError)
+      );
+  }
+
   downloadReport(fileId: string): Observable<Blob> {
     return this.http.get(`${this.apiUrl}/download-report/${fileId}`, {
       responseType: 'blob'
@@ -82,5 +82,5 @@ echo ""
 echo "Note: Make sure your YOLOv11 model is available at:"
 echo "/content/drive/MyDrive/yolo-new/bridge_crack_yolov11_best.pt"
 echo ""
-echo "Or update the MODEL_PATH in backend/main.py"
+echo "Or set MODEL_PATH (see backend/config.py)"
 echo "==================================="
\ No newline at end of file